@@ -0,0 +1,76 @@
+"""Wire bytes, latency and client decode CPU for identity / gzip / zstd webhook replies.
+
+Ticket-list replies of growing size come from the local stub, which compresses
+them when they are at least ``--min-bytes`` big. The client mirrors
+``get_http_session()`` in streamlit_app.py: a pooled Session and urllib3's
+transparent decoding, with ``Accept-Encoding`` pinned per mode.
+
+    python bench/bench_compression.py --tickets 10 100 1000 --requests 50
+"""
+import argparse
+import statistics
+import time
+
+import requests
+from urllib3.response import HAS_ZSTD
+
+from n8n_stub import start_stub
+
+MODES = {"identity": "identity", "gzip": "gzip", "zstd": "zstd"}
+
+
+def run(session: requests.Session, url: str, encoding: str, count: int) -> dict:
+    latencies, cpu, wire, decoded = [], [], 0, 0
+    for i in range(count):
+        t0 = time.perf_counter()
+        r = session.post(
+            url,
+            json={"message": "show tickets", "sessionId": "bench", "userId": "bench@local"},
+            headers={"Accept-Encoding": encoding},
+            stream=True,
+            timeout=(5, 30),
+        )
+        # decompression happens while the body is read; thread CPU leaves out the stub's threads
+        c0 = time.thread_time()
+        body = r.content
+        cpu.append(time.thread_time() - c0)
+        r.json()
+        latencies.append(time.perf_counter() - t0)
+        wire += r.raw.tell()
+        decoded += len(body)
+    return {
+        "p50_ms": statistics.median(latencies) * 1000,
+        "wire_kb": wire / count / 1024,
+        "decoded_kb": decoded / count / 1024,
+        "cpu_ms": statistics.mean(cpu) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tickets", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--min-bytes", type=int, default=1024, help="stub compresses replies at least this big")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    stub = start_stub(latency_ms=args.latency_ms, shape="tickets", compress_min_bytes=args.min_bytes)
+    session = requests.Session()
+    modes = [m for m in MODES if m != "zstd" or HAS_ZSTD]
+    if not HAS_ZSTD:
+        print("zstd skipped: install backports.zstd (Python < 3.14) to enable it\n")
+
+    print(f"{'tickets':>7} {'mode':<9} {'wire KB':>8} {'body KB':>8} {'ratio':>6} {'p50 ms':>7} {'decode CPU ms':>14}")
+    for tickets in args.tickets:
+        stub.tickets = tickets
+        for mode in modes:
+            res = run(session, stub.url, MODES[mode], args.requests)
+            ratio = res["decoded_kb"] / res["wire_kb"] if res["wire_kb"] else 0
+            print(
+                f"{tickets:>7} {mode:<9} {res['wire_kb']:>8.1f} {res['decoded_kb']:>8.1f} {ratio:>6.1f} "
+                f"{res['p50_ms']:>7.2f} {res['cpu_ms']:>14.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
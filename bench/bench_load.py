@@ -0,0 +1,157 @@
+"""Concurrent-session load test: throughput, p99 turn latency and RSS per session count.
+
+Drives streamlit_app.py headlessly with Streamlit's AppTest: every simulated
+user is its own AppTest (own session state, own session id) inside this one
+process, so caches, the HTTP pool and the backend worker pool are shared the
+way they are in a real server. Users alternate between typing chat prompts and
+clicking Quick actions, against the local n8n stub (mixed reply shapes) or an
+existing webhook.
+
+AppTest can only run one script at a time per process, so script runs are
+interleaved round-robin while backend calls overlap on the app's worker pool.
+The numbers are therefore a lower bound for a real server, where script runs
+also overlap (GIL permitting).
+
+    python bench/bench_load.py --sessions 1 5 10 25 --turns 5 --latency-ms 200
+"""
+import argparse
+import os
+import random
+import resource
+import statistics
+import tempfile
+import time
+
+from streamlit import logger
+from streamlit.testing.v1 import AppTest
+
+from n8n_stub import start_stub
+
+APP = os.path.join(os.path.dirname(__file__), "..", "streamlit_app.py")
+
+CHAT_PROMPTS = [
+    "show company Riverport Landings Senior",
+    "show tickets",
+    "what is the roof type at Maple Court?",
+    "create service ticket for Riverport Landings Senior",
+    "summarize open work orders",
+]
+QUICK_ACTIONS = ["📊 Dashboard", "🏢 Find a property", "🎟️ Check tickets"]
+
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # peak rather than current RSS, but good enough where /proc is missing
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class User:
+    """One simulated browser session: think, send a turn, poll until the reply lands."""
+
+    def __init__(self, index: int, url: str, db_path: str, turns: int, quick_ratio: float, think_ms: float, tag: str):
+        self.at = AppTest.from_file(APP, default_timeout=120)
+        self.at.secrets["N8N_WEBHOOK_URL"] = url
+        self.at.secrets["CHAT_DB_PATH"] = db_path
+        self.at.session_state["session_id"] = f"{tag}-{index}"
+        self.at.session_state["user_id"] = f"load{index}@local"
+        self.turns_left = turns
+        self.quick_ratio = quick_ratio
+        self.think = think_ms / 1000.0
+        self.next_at = time.perf_counter() + random.uniform(0, self.think)
+        self.sent_at = None
+        self.latencies = []
+        self.at.run()
+
+    @property
+    def finished(self) -> bool:
+        return not self.turns_left and self.sent_at is None
+
+    def step(self):
+        now = time.perf_counter()
+        if self.sent_at is not None:
+            self.at.run()
+            if not self.at.session_state["jobs"]:
+                self.latencies.append(time.perf_counter() - self.sent_at)
+                self.sent_at = None
+                self.turns_left -= 1
+                self.next_at = time.perf_counter() + self.think
+        elif self.turns_left and now >= self.next_at:
+            self.sent_at = now
+            if random.random() < self.quick_ratio:
+                label = random.choice(QUICK_ACTIONS)
+                next(b for b in self.at.button if b.label == label).click().run()
+            else:
+                self.at.chat_input[0].set_value(random.choice(CHAT_PROMPTS)).run()
+        if self.at.exception:
+            raise RuntimeError(f"app raised: {self.at.exception[0].value}")
+
+
+def measure(sessions: int, args, url: str) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        baseline = rss_mb()
+        users = [
+            User(i, url, os.path.join(tmp, "load.sqlite3"), args.turns, args.quick_ratio, args.think_ms, f"load{sessions}")
+            for i in range(sessions)
+        ]
+
+        t0 = time.perf_counter()
+        while not all(u.finished for u in users):
+            busy = False
+            for user in users:
+                if not user.finished:
+                    user.step()
+                    busy = busy or user.sent_at is not None
+            if not busy:
+                time.sleep(0.005)
+        wall = time.perf_counter() - t0
+
+        latencies = sorted(lat for u in users for lat in u.latencies)
+        rss = rss_mb()
+        return {
+            "turns": len(latencies),
+            "throughput": len(latencies) / wall,
+            "p50_ms": statistics.median(latencies) * 1000,
+            "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+            "rss_mb": rss,
+            "rss_per_session_mb": max(rss - baseline, 0) / sessions,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 5, 10, 25])
+    parser.add_argument("--turns", type=int, default=5, help="turns per session")
+    parser.add_argument("--quick-ratio", type=float, default=0.3, help="share of turns sent via Quick actions")
+    parser.add_argument("--think-ms", type=float, default=500.0, help="pause between a reply and the next turn")
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    parser.add_argument("--jitter-ms", type=float, default=100.0)
+    parser.add_argument("--url", help="load an existing webhook instead of the local stub")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    # pool threads call cached resources without a ScriptRunContext; keep the table readable
+    logger.set_log_level("error")
+    stub = None if args.url else start_stub(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, shape="mixed")
+    url = args.url or stub.url
+
+    # one throwaway turn so the first row doesn't carry imports and process-wide setup
+    measure(1, argparse.Namespace(**{**vars(args), "turns": 1}), url)
+
+    print(f"{'sessions':>8} {'turns':>6} {'turns/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'RSS MB':>7} {'MB/sess':>8}")
+    for sessions in args.sessions:
+        res = measure(sessions, args, url)
+        print(
+            f"{sessions:>8} {res['turns']:>6} {res['throughput']:>8.2f} {res['p50_ms']:>8.0f} "
+            f"{res['p99_ms']:>8.0f} {res['rss_mb']:>7.0f} {res['rss_per_session_mb']:>8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
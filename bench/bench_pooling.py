@@ -0,0 +1,69 @@
+"""Per-message latency and throughput of call_n8n's HTTP layer, with and without pooling.
+
+"fresh" mirrors the old ``requests.post`` per message; "pooled" mirrors
+``get_http_session()`` in streamlit_app.py (one Session, HTTPAdapter pool).
+
+    python bench/bench_pooling.py --messages 300 --workers 8 --latency-ms 5
+"""
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from n8n_stub import start_stub
+
+
+def pooled_session(pool_size: int) -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def run(post, url: str, messages: int, workers: int) -> dict:
+    def one(i: int) -> float:
+        payload = {"message": f"show tickets {i}", "sessionId": "bench", "userId": "bench@local"}
+        t0 = time.perf_counter()
+        r = post(url, json=payload, timeout=(5, 30))
+        r.raise_for_status()
+        r.json()
+        return time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        latencies = sorted(pool.map(one, range(messages)))
+    wall = time.perf_counter() - t0
+
+    return {
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        "throughput": messages / wall,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=300)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=5.0)
+    parser.add_argument("--url", help="benchmark an existing webhook instead of the local stub")
+    args = parser.parse_args()
+
+    stub = None if args.url else start_stub(latency_ms=args.latency_ms)
+    url = args.url or stub.url
+
+    modes = [("fresh", requests.post), ("pooled", pooled_session(max(args.workers, 1)).post)]
+    print(f"{'mode':<8} {'p50 ms':>8} {'p95 ms':>8} {'msg/s':>8} {'conns':>6}")
+    for name, post in modes:
+        before = stub.connections if stub else 0
+        res = run(post, url, args.messages, args.workers)
+        conns = (stub.connections - before) if stub else "-"
+        print(f"{name:<8} {res['p50_ms']:>8.2f} {res['p95_ms']:>8.2f} {res['throughput']:>8.1f} {conns:>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Chat page rerun time with 10/100/1000 stored messages, windowed vs. drawing everything.
+
+Drives streamlit_app.py headlessly with Streamlit's AppTest against a throwaway
+SQLite store, so nothing touches the real chat history.
+
+    python bench/bench_render.py --sizes 10 100 1000 --reruns 5
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from streamlit.testing.v1 import AppTest
+
+APP = os.path.join(os.path.dirname(__file__), "..", "streamlit_app.py")
+
+
+def seed(db_path: str, session_id: str, count: int):
+    conn = sqlite3.connect(db_path)
+    rows = []
+    for i in range(count):
+        role = "user" if i % 2 == 0 else "assistant"
+        content = f"show tickets for building {i}" if role == "user" else f"Ticket **#{i}** is open.\n\n- roof leak\n- unit {i}"
+        rows.append((session_id, "bench@local", role, content, None, None, time.time()))
+    with conn:
+        conn.executemany(
+            "INSERT INTO messages (session_id, user_id, role, content, data, raw_ref, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+    conn.close()
+
+
+def app(db_path: str, session_id: str, count: int, windowed: bool) -> AppTest:
+    at = AppTest.from_file(APP, default_timeout=120)
+    at.secrets["N8N_WEBHOOK_URL"] = ""
+    at.secrets["CHAT_DB_PATH"] = db_path
+    if not windowed:
+        at.secrets["HISTORY_PAGE_SIZE"] = count
+        at.secrets["HISTORY_MAX_LOADED"] = count
+        at.secrets["CHAT_RENDER_WINDOW"] = count
+    at.session_state["session_id"] = session_id
+    return at
+
+
+def measure(count: int, windowed: bool, reruns: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.sqlite3")
+        session_id = f"bench-{count}-{'windowed' if windowed else 'full'}"
+
+        # first run creates the schema; seed, then open the seeded session so history loads
+        app(db_path, "bench-schema", count, windowed).run()
+        seed(db_path, session_id, count)
+        at = app(db_path, session_id, count, windowed)
+        at.run()
+
+        timings = []
+        for _ in range(reruns):
+            t0 = time.perf_counter()
+            at.run()
+            timings.append(time.perf_counter() - t0)
+
+        return {"rerun_ms": statistics.median(timings) * 1000, "bubbles": len(at.chat_message)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--reruns", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'messages':>8} {'mode':<9} {'rerun ms':>9} {'bubbles':>8}")
+    for count in args.sizes:
+        for windowed in (False, True):
+            res = measure(count, windowed, args.reruns)
+            mode = "windowed" if windowed else "full"
+            print(f"{count:>8} {mode:<9} {res['rerun_ms']:>9.1f} {res['bubbles']:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""Bytes of element deltas the app sends per rerun (what goes over the websocket each script run).
+
+Runs the app headlessly with AppTest and sums the serialized protobuf size of
+every element/block produced by a rerun. Point --app at another copy of the
+script (e.g. from `git show <rev>:streamlit_app.py`) to compare revisions.
+
+    python bench/bench_rerun_bytes.py
+    python bench/bench_rerun_bytes.py --app /tmp/streamlit_app_old.py
+"""
+import argparse
+import os
+from collections import Counter
+
+from streamlit.testing.v1 import AppTest
+
+APP = os.path.join(os.path.dirname(__file__), "..", "streamlit_app.py")
+
+
+def proto_bytes(node, by_type: Counter) -> int:
+    total = 0
+    proto = getattr(node, "proto", None)
+    if proto is not None and hasattr(proto, "SerializeToString"):
+        size = len(proto.SerializeToString())
+        by_type[getattr(node, "type", type(node).__name__)] += size
+        total += size
+    for child in getattr(node, "children", {}).values():
+        total += proto_bytes(child, by_type)
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--app", default=APP)
+    parser.add_argument("--top", type=int, default=5, help="show the N largest element types")
+    args = parser.parse_args()
+
+    at = AppTest.from_file(os.path.abspath(args.app), default_timeout=60)
+    at.secrets["N8N_WEBHOOK_URL"] = ""
+    at.run()
+    at.run()  # measure a steady-state rerun, not the first run
+
+    by_type = Counter()
+    total = proto_bytes(at._tree, by_type)
+    print(f"{args.app}: {total} bytes per rerun")
+    for name, size in by_type.most_common(args.top):
+        print(f"  {name:<20} {size:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+"""Local stand-in for the n8n webhook, used by the benchmarks in this folder.
+
+Run standalone with ``python bench/n8n_stub.py --port 8765 --latency-ms 20`` and
+point ``N8N_WEBHOOK_URL`` at ``http://127.0.0.1:8765/webhook``, or start it
+in-process with ``start_stub()``.
+
+``--shape`` picks which of n8n's reply shapes the stub answers with; ``mixed``
+sends a property card for company/property prompts, a ticket list (``--tickets``
+entries) for ticket prompts and rotates through the other shapes for everything
+else. With ``--compress-min-bytes`` replies at least that big are gzip/zstd
+encoded when the client accepts it, like n8n behind a compressing proxy.
+"""
+import argparse
+import gzip
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    from compression import zstd  # Python 3.14+
+except ImportError:
+    try:
+        from backports import zstd
+    except ImportError:
+        zstd = None
+
+SHAPES = ["message", "list", "reply", "output", "property", "tickets", "mixed"]
+PROPERTY_PROMPT = re.compile(r"\b(company|property|building)\b", re.I)
+TICKET_PROMPT = re.compile(r"\btickets?\b", re.I)
+_rotation = itertools.count()
+
+
+def property_data(prompt: str) -> dict:
+    name = prompt.split("company", 1)[-1].strip() or "Riverport Landings Senior"
+    return {
+        "chosen": {
+            "attributes": {
+                "name": name,
+                "streetAddress": "1200 River Rd",
+                "city": "Minneapolis",
+                "state": "MN",
+                "postalCode": "55401",
+                "roofType": "TPO",
+                "numberOfBuildings": 3,
+                "squares": 412,
+                "closeRate": 38,
+                "activity": "Inspection scheduled; 2 open service tickets",
+            },
+            "options": {"text": "https://example.invalid/properties/1200-river-rd"},
+        }
+    }
+
+
+def ticket_data(count: int) -> dict:
+    statuses = ["open", "in progress", "waiting on vendor", "scheduled"]
+    return {
+        "tickets": [
+            {
+                "id": f"T-{10000 + i}",
+                "title": f"Roof leak above unit {100 + i % 40}",
+                "status": statuses[i % len(statuses)],
+                "priority": ["low", "normal", "high"][i % 3],
+                "property": "Riverport Landings Senior",
+                "created": f"2024-0{1 + i % 9}-{10 + i % 18}T09:30:00Z",
+                "description": "Tenant reports water staining on the ceiling after heavy rain; "
+                "inspect membrane seams and flashing around the rooftop HVAC curb.",
+            }
+            for i in range(count)
+        ]
+    }
+
+
+def reply_body(prompt: str, shape: str, tickets: int = 25):
+    """Build a webhook reply for ``prompt`` in one of n8n's shapes."""
+    reply = f"echo: {prompt}"
+    if shape == "mixed":
+        if PROPERTY_PROMPT.search(prompt):
+            shape = "property"
+        elif TICKET_PROMPT.search(prompt):
+            shape = "tickets"
+        else:
+            shape = SHAPES[next(_rotation) % 4]
+    if shape == "list":
+        return [{"message": reply, "data": {}}]
+    if shape == "reply":
+        return {"reply": {"message": reply, "data": {}}}
+    if shape == "output":
+        return {"output": reply}
+    if shape == "property":
+        data = property_data(prompt)
+        return [{"message": f"Here is {data['chosen']['attributes']['name']}.", "data": data}]
+    if shape == "tickets":
+        return [{"message": f"{tickets} open tickets.", "data": ticket_data(tickets)}]
+    return {"message": reply, "data": {}}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 so clients can keep the connection alive between requests
+    protocol_version = "HTTP/1.1"
+    # headers and body go out in separate writes; don't let Nagle hold the body back
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        # n8n's /healthz; the app's endpoint probes hit it
+        body = b'{"status":"ok"}'
+        self.send_response(200 if self.path == "/healthz" else 404)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length)
+        if self.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        payload = json.loads(body or b"{}")
+
+        latency = self.server.latency_ms + random.uniform(0, self.server.jitter_ms)
+        if latency:
+            time.sleep(latency / 1000.0)
+
+        if random.random() < self.server.error_rate:
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        prompt = payload.get("message", "")
+        if self.server.stream:
+            self._stream(f"echo: {prompt}")
+            return
+
+        body = json.dumps(reply_body(prompt, self.server.shape, self.server.tickets)).encode()
+        encoding = self._encoding(len(body))
+        if encoding == "zstd":
+            body = zstd.compress(body)
+        elif encoding == "gzip":
+            body = gzip.compress(body, 6)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        if encoding:
+            self.send_header("Content-Encoding", encoding)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _encoding(self, size: int):
+        if self.server.compress_min_bytes is None or size < self.server.compress_min_bytes:
+            return None
+        accepted = {e.split(";")[0].strip() for e in self.headers.get("Accept-Encoding", "").split(",")}
+        if "zstd" in accepted and zstd is not None:
+            return "zstd"
+        return "gzip" if "gzip" in accepted else None
+
+    def _stream(self, reply: str):
+        # Same framing as n8n's streaming webhook response: one JSON object per line, chunked
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        events = [{"type": "begin"}]
+        events += [{"type": "item", "content": word + " "} for word in reply.split()]
+        events.append({"type": "end"})
+        for event in events:
+            line = (json.dumps(event) + "\n").encode()
+            self.wfile.write(f"{len(line):X}\r\n".encode() + line + b"\r\n")
+            self.wfile.flush()
+            if self.server.token_delay_ms:
+                time.sleep(self.server.token_delay_ms / 1000.0)
+        self.wfile.write(b"0\r\n\r\n")
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address,
+        latency_ms: float = 0.0,
+        stream: bool = False,
+        token_delay_ms: float = 0.0,
+        shape: str = "message",
+        jitter_ms: float = 0.0,
+        error_rate: float = 0.0,
+        tickets: int = 25,
+        compress_min_bytes: int = None,
+    ):
+        super().__init__(address, StubHandler)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.tickets = tickets
+        self.compress_min_bytes = compress_min_bytes
+        self.shape = shape
+        self.stream = stream
+        self.token_delay_ms = token_delay_ms
+        self.connections = 0
+
+    def get_request(self):
+        conn = super().get_request()
+        self.connections += 1
+        return conn
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/webhook"
+
+
+def start_stub(port: int = 0, latency_ms: float = 0.0, **options) -> StubServer:
+    server = StubServer(("127.0.0.1", port), latency_ms=latency_ms, **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="extra random latency, uniform in [0, jitter]")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with a 503")
+    parser.add_argument("--tickets", type=int, default=25, help="entries in a ticket-list reply")
+    parser.add_argument("--compress-min-bytes", type=int, help="gzip/zstd-encode replies at least this big")
+    parser.add_argument("--shape", choices=SHAPES, default="message", help="reply shape for non-streaming replies")
+    parser.add_argument("--stream", action="store_true", help="reply with n8n-style NDJSON chunks")
+    parser.add_argument("--token-delay-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = StubServer(
+        ("127.0.0.1", args.port),
+        latency_ms=args.latency_ms,
+        stream=args.stream,
+        token_delay_ms=args.token_delay_ms,
+        shape=args.shape,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        tickets=args.tickets,
+        compress_min_bytes=args.compress_min_bytes,
+    )
+    print(f"n8n stub listening on {server.url}")
+    server.serve_forever()
@@ -0,0 +1 @@
+"""Backend plumbing for streamlit_app.py that doesn't touch Streamlit, so it can be imported (and tested) on its own."""
@@ -0,0 +1,122 @@
+"""Admission control: a global cap on n8n executions, per-user token buckets, and priority order."""
+import bisect
+import threading
+import time
+from collections import deque
+
+PRIORITIES = {"chat": 0, "quick": 1, "prefetch": 2}
+
+class NotAdmitted(Exception):
+    pass
+
+class Ticket:
+    """One backend call's place in the admission queue; the pending bubble reads `position` and `ready_in`."""
+
+    def __init__(self, user_id: str, priority: str = "chat"):
+        self.user_id = user_id
+        self.priority = priority
+        self.order = (PRIORITIES[priority], time.monotonic())
+        self.position = None  # place in line while queued, 0 once admitted
+        self.ready_in = 0.0  # seconds until the user's rate limit lets this call out
+        self.throttled = False
+        self.cancelled = threading.Event()
+
+class Admission:
+    """Lets at most `max_in_flight` backend calls run at once, in priority order.
+
+    Every user also has a token bucket (`rate_per_minute`, up to `burst` saved up). A call whose
+    user is out of tokens waits without holding up the calls queued behind it. Prefetches never
+    wait and don't spend the user's tokens (they have their own budget).
+    """
+
+    def __init__(self, max_in_flight: int, rate_per_minute: float, burst: int):
+        self.max_in_flight = max_in_flight
+        self.rate = rate_per_minute / 60
+        self.burst = burst
+        self._cond = threading.Condition()
+        self._queue = []  # waiting tickets, sorted by (priority, arrival)
+        self._buckets = {}  # user id -> (tokens, as of)
+        self.in_flight = 0
+        self.admitted = 0
+        self.rate_limited = 0
+        self.skipped = 0
+        self._waits = deque(maxlen=256)  # ms from arrival to admission
+
+    def _tokens(self, user_id: str, now: float) -> float:
+        tokens, as_of = self._buckets.get(user_id, (self.burst, now))
+        return min(self.burst, tokens + (now - as_of) * self.rate)
+
+    def _spend(self, user_id: str, now: float):
+        self._buckets[user_id] = (self._tokens(user_id, now) - 1, now)
+        if len(self._buckets) > 4096:
+            # A full bucket is the same as no bucket
+            for uid in [u for u in self._buckets if self._tokens(u, now) >= self.burst]:
+                del self._buckets[uid]
+
+    def _ready(self, ticket: Ticket, now: float) -> bool:
+        return ticket.priority == "prefetch" or self.rate <= 0 or self._tokens(ticket.user_id, now) >= 1
+
+    def _update(self, now: float):
+        for position, ticket in enumerate(self._queue, 1):
+            ticket.position = position
+            ticket.ready_in = 0.0 if self._ready(ticket, now) else (1 - self._tokens(ticket.user_id, now)) / self.rate
+
+    def acquire(self, ticket: Ticket) -> bool:
+        """Block until `ticket` may call n8n; False if it was cancelled or is a prefetch that would have to wait."""
+        arrived = time.monotonic()
+        with self._cond:
+            bisect.insort(self._queue, ticket, key=lambda t: t.order)
+            try:
+                while not ticket.cancelled.is_set():
+                    now = time.monotonic()
+                    head = next((t for t in self._queue if self._ready(t, now)), None)
+                    if head is ticket and self.in_flight < self.max_in_flight:
+                        if ticket.priority != "prefetch" and self.rate > 0:
+                            self._spend(ticket.user_id, now)
+                        self.in_flight += 1
+                        self.admitted += 1
+                        self._waits.append((now - arrived) * 1000)
+                        ticket.position, ticket.ready_in = 0, 0.0
+                        return True
+                    if ticket.priority == "prefetch":
+                        self.skipped += 1
+                        return False
+                    if not self._ready(ticket, now) and not ticket.throttled:
+                        ticket.throttled = True
+                        self.rate_limited += 1
+                    self._update(now)
+                    # Woken by releases; the timeout notices cancellations and token refills
+                    self._cond.wait(min(ticket.ready_in or 0.5, 0.5))
+                return False
+            finally:
+                self._queue.remove(ticket)
+                self._update(time.monotonic())
+                self._cond.notify_all()
+
+    def try_acquire(self) -> bool:
+        """Take a free slot without queueing, unless someone is already waiting for one (for hedges)."""
+        with self._cond:
+            if self._queue or self.in_flight >= self.max_in_flight:
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def stats(self) -> dict:
+        with self._cond:
+            waits = sorted(self._waits)
+            queued = {name: 0 for name in PRIORITIES}
+            for ticket in self._queue:
+                queued[ticket.priority] += 1
+            return {
+                "in_flight": self.in_flight,
+                "queued": queued,
+                "admitted": self.admitted,
+                "rate_limited": self.rate_limited,
+                "skipped": self.skipped,
+                "p95_wait_ms": waits[int(len(waits) * 0.95)] if waits else 0.0,
+            }
@@ -0,0 +1,212 @@
+"""SQLite conversation store, with an in-memory search index per session."""
+import bisect
+import json
+import re
+import sqlite3
+import threading
+import time
+
+CHAT_SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    data TEXT,
+    raw_ref TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_messages_session ON messages (session_id, id);
+CREATE INDEX IF NOT EXISTS idx_messages_user ON messages (user_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_messages_created ON messages (created_at);
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+SEARCH_TOKEN = re.compile(r"\w+")
+
+class SearchIndex:
+    """In-memory inverted index over message content + role, one per session, built on first search.
+
+    Message ids only grow, so posting lists stay sorted by appending; the store feeds new
+    messages in through add() and searches never rescan the table.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sessions = {}  # session_id -> {"ids", "created", "roles", "postings", "vocab"}
+
+    def loaded(self, session_id: str) -> bool:
+        with self._lock:
+            return session_id in self._sessions
+
+    def load(self, session_id: str, rows):
+        with self._lock:
+            if session_id in self._sessions:
+                return
+            index = self._sessions[session_id] = {"ids": [], "created": [], "roles": {}, "postings": {}, "vocab": []}
+            for row in rows:
+                self._add(index, row["id"], row["role"], row["content"], row["created_at"])
+
+    def add(self, session_id: str, msg: dict):
+        with self._lock:
+            index = self._sessions.get(session_id)
+            if index is not None:
+                self._add(index, msg["id"], msg["role"], msg["content"], msg["created_at"])
+
+    @staticmethod
+    def _add(index: dict, msg_id: int, role: str, content: str, created_at: float):
+        if index["ids"] and msg_id <= index["ids"][-1]:
+            return  # already picked up by load()
+        index["ids"].append(msg_id)
+        index["created"].append(created_at)
+        index["roles"].setdefault(role, []).append(msg_id)
+        for token in set(SEARCH_TOKEN.findall(content.lower())):
+            postings = index["postings"].get(token)
+            if postings is None:
+                postings = index["postings"][token] = []
+                bisect.insort(index["vocab"], token)
+            postings.append(msg_id)
+
+    def drop(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def search(self, session_id: str, query: str = "", role: str = None, since: float = None, until: float = None) -> list:
+        """Ids matching every word of `query` (the last one as a prefix), newest first."""
+        with self._lock:
+            index = self._sessions.get(session_id)
+            if index is None:
+                return []
+            ids = index["ids"]
+            lo = bisect.bisect_left(index["created"], since) if since is not None else 0
+            hi = bisect.bisect_left(index["created"], until) if until is not None else len(ids)
+            if lo >= hi:
+                return []
+
+            tokens = SEARCH_TOKEN.findall(query.lower())
+            if not tokens:
+                matches = ids[lo:hi]
+                if role:
+                    roles = set(index["roles"].get(role, ()))
+                    matches = [i for i in matches if i in roles]
+                return matches[::-1]
+
+            *words, prefix = tokens
+            vocab = index["vocab"]
+            start = bisect.bisect_left(vocab, prefix)
+            end = bisect.bisect_left(vocab, prefix + "\U0010ffff")
+            sets = [set(index["postings"].get(word, ())) for word in words]
+            sets.append(set().union(*(index["postings"][token] for token in vocab[start:end])))
+            if role:
+                sets.append(set(index["roles"].get(role, ())))
+            sets.sort(key=len)
+            matches = sets[0].intersection(*sets[1:])
+            first_id, last_id = ids[lo], ids[hi - 1]
+            return sorted((i for i in matches if first_id <= i <= last_id), reverse=True)
+
+class ConversationStore:
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        self.index = SearchIndex()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(CHAT_SCHEMA)
+            columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(messages)")}
+            if "raw_ref" not in columns:
+                # databases created before payloads moved to the blob store
+                self._conn.execute("ALTER TABLE messages ADD COLUMN raw_ref TEXT")
+
+    @staticmethod
+    def _message(row) -> dict:
+        # raw payloads live in the blob store; messages only carry the reference
+        return {
+            "id": row["id"],
+            "role": row["role"],
+            "content": row["content"],
+            "data": json.loads(row["data"]) if row["data"] else None,
+            "raw_ref": row["raw_ref"],
+            "created_at": row["created_at"],
+        }
+
+    def append(self, session_id: str, user_id: str, role: str, content: str, raw_ref: str = None, data=None) -> dict:
+        created_at = time.time()
+        with self._lock:
+            with self._conn:
+                cur = self._conn.execute(
+                    "INSERT INTO messages (session_id, user_id, role, content, data, raw_ref, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (session_id, user_id, role, content, json.dumps(data) if data else None, raw_ref, created_at),
+                )
+            msg = {
+                "id": cur.lastrowid,
+                "role": role,
+                "content": content,
+                "data": data or None,
+                "raw_ref": raw_ref,
+                "created_at": created_at,
+            }
+            # Still under the store lock, which search() holds from reading the rows until the index is loaded
+            self.index.add(session_id, msg)
+        return msg
+
+    def claim(self, session_id: str, owner: str):
+        """Record which browser started a session (first claim wins)."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO sessions (session_id, owner, created_at) VALUES (?, ?, ?)",
+                (session_id, owner, time.time()),
+            )
+
+    def owner(self, session_id: str):
+        with self._lock:
+            row = self._conn.execute("SELECT owner FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return row["owner"] if row else None
+
+    def recent(self, session_id: str, limit: int, offset: int = 0) -> list:
+        """Newest `limit` turns of a session (skipping `offset`), oldest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, role, content, data, raw_ref, created_at FROM messages "
+                "WHERE session_id = ? ORDER BY id DESC LIMIT ? OFFSET ?",
+                (session_id, limit, offset),
+            ).fetchall()
+        return [self._message(row) for row in reversed(rows)]
+
+    def count(self, session_id: str) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM messages WHERE session_id = ?", (session_id,)).fetchone()[0]
+
+    def search(self, session_id: str, query: str = "", role: str = None, since: float = None, until: float = None) -> list:
+        """Ids of the session's matching messages, newest first (see SearchIndex.search)."""
+        if not self.index.loaded(session_id):
+            # One lock over the read and the load: an append() in between would find no index to add to
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT id, role, content, created_at FROM messages WHERE session_id = ? ORDER BY id", (session_id,)
+                ).fetchall()
+                self.index.load(session_id, rows)
+        return self.index.search(session_id, query, role, since, until)
+
+    def get_many(self, ids: list) -> list:
+        """Messages by id, newest first."""
+        if not ids:
+            return []
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, role, content, data, raw_ref, created_at FROM messages WHERE id IN ({','.join('?' * len(ids))}) "
+                "ORDER BY id DESC",
+                list(ids),
+            ).fetchall()
+        return [self._message(row) for row in rows]
+
+    def clear(self, session_id: str):
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            self.index.drop(session_id)
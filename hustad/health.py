@@ -0,0 +1,72 @@
+"""Circuit breaker over n8n webhook calls."""
+import threading
+import time
+
+class BackendUnavailable(Exception):
+    def __init__(self, retry_in: float):
+        super().__init__(f"n8n circuit is open; next attempt in {retry_in:.0f}s.")
+        self.retry_in = retry_in
+
+class BackendHealth:
+    """Circuit breaker over webhook attempts, plus retry/hedge counters.
+
+    `threshold` consecutive failures (connection errors, timeouts, 502/503/504) open the
+    circuit: calls fail fast for `reset_seconds`, then a single probe is let through.
+    """
+
+    def __init__(self, threshold: int, reset_seconds: float):
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self.failures = 0  # consecutive
+        self.opened_at = None
+        self._probing = False
+        self.retries = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.fast_failed = 0
+
+    def before_call(self):
+        """Return None if a call may go out, else the seconds until the next probe."""
+        with self._lock:
+            if self.opened_at is None:
+                return None
+            retry_in = self.opened_at + self.reset_seconds - time.monotonic()
+            if retry_in > 0 or self._probing:
+                self.fast_failed += 1
+                return max(retry_in, 0)
+            self._probing = True
+            return None
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probing or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+                self._probing = False
+
+    def count(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def state(self) -> str:
+        with self._lock:
+            if self.opened_at is None:
+                return "degraded" if self.failures else "online"
+            return "offline" if time.monotonic() - self.opened_at < self.reset_seconds else "degraded"
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "failures": self.failures,
+                "retries": self.retries,
+                "hedged": self.hedged,
+                "hedge_wins": self.hedge_wins,
+                "fast_failed": self.fast_failed,
+            }
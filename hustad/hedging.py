@@ -0,0 +1,26 @@
+"""Hedged requests: a second copy of a slow call, raced against the first and counted by admission."""
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+from hustad.admission import Admission
+
+def submit_hedge(gate: Admission, pool: ThreadPoolExecutor, primary: Future, fn, *args) -> Future:
+    """Run `fn(*args)` next to `primary` in a spare admission slot; None when there is none (hedges never queue).
+
+    The caller's own slot covers whichever of the two requests it ends up using. The hedge's slot
+    is held until both have finished, so the loser still counts against the cap while it runs on.
+    """
+    if not gate.try_acquire():
+        return None
+    hedge = pool.submit(fn, *args)
+    hedge.add_done_callback(lambda _: primary.add_done_callback(lambda _: gate.release()))
+    return hedge
+
+def first_success(primary: Future, hedge: Future) -> Future:
+    """Whichever of the two succeeds first; `primary` if both fail."""
+    pending = {primary, hedge}
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in (primary, hedge):
+            if future in done and future.exception() is None:
+                return future
+    return primary
@@ -0,0 +1,90 @@
+"""Prompt classification, and the response cache for the lookups it finds idempotent."""
+import re
+import threading
+import time
+from collections import OrderedDict
+
+# A mutation is a request to change something: one of these verbs opening a clause, as an imperative
+# (optionally after "please", "can you" and the like). Elsewhere they are just words in a lookup,
+# e.g. "show new tickets" or "tickets to close".
+MUTATING_PROMPT = re.compile(
+    r"(?:^|[,.;:!?]\s*|\b(?:and|then|also)\s+)"
+    r"(?:(?:please|pls|kindly|can you|could you|would you|will you|i want to|i'd like to|i need to"
+    r"|help me|let's|go ahead and)\s+)*"
+    r"(create|new|update|edit|change|delete|remove|close|cancel|assign|add|schedule|submit)\b"
+)
+PROMPT_INTENTS = [
+    ("tickets", re.compile(r"\btickets?\b")),
+    ("property", re.compile(r"\b(company|property|properties|building|buildings)\b")),
+]
+
+def normalize_prompt(message: str) -> str:
+    return " ".join(message.lower().split())
+
+def classify_prompt(message: str) -> str:
+    prompt = normalize_prompt(message)
+    if MUTATING_PROMPT.search(prompt):
+        return "mutation"
+    for intent, pattern in PROMPT_INTENTS:
+        if pattern.search(prompt):
+            return intent
+    return "other"
+
+class ResponseCache:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # (prompt, user_id) -> (expires_at, response)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return dict(entry[1])
+            if entry:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def contains(self, key) -> bool:
+        # Unlike get(), doesn't touch the LRU order or the hit/miss counters
+        with self._lock:
+            entry = self._entries.get(key)
+            return bool(entry and entry[0] > time.monotonic())
+
+    def put(self, key, response: dict, ttl: float):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, dict(response))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def bypass(self, user_id: str):
+        # A mutating prompt can make anything cached for this user stale
+        with self._lock:
+            self.bypassed += 1
+            for key in [k for k in self._entries if k[1] == user_id]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "bypassed": self.bypassed,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,130 @@
+"""Routing of webhook calls across several n8n instances."""
+import random
+import threading
+import time
+import urllib.parse
+from collections import OrderedDict
+
+import requests
+
+class EndpointRouter:
+    """Picks the webhook URL for each attempt.
+
+    Calls go to the healthy endpoint with the lowest (in flight + 1) × EWMA time to response,
+    so a slow or busy instance gets less traffic. `eject_after` consecutive failures take an
+    endpoint out of rotation; a background probe of its health URL every `probe_interval`
+    seconds puts it back (or ejects one that stops answering) until stop() is called. With every
+    endpoint ejected, calls still go to the least bad one and the circuit breaker decides.
+
+    Prompts that use n8n's session memory pass their session id and stay on the endpoint
+    they first landed on while it is healthy, in case memory is local to the instance.
+    """
+
+    ALPHA = 0.3  # EWMA weight of the newest sample
+
+    def __init__(
+        self, urls: tuple, eject_after: int, probe_interval: float, probe_timeout: float, health_path: str, sticky_max: int
+    ):
+        self._lock = threading.Lock()
+        self.endpoints = {
+            url: {"in_flight": 0, "ewma_ms": None, "requests": 0, "errors": 0, "failures": 0, "healthy": True, "probed_at": None}
+            for url in urls
+        }
+        self.eject_after = eject_after
+        self.health_path = health_path
+        self._sticky = OrderedDict()  # session id -> endpoint, LRU
+        self.sticky_max = sticky_max
+        self._stopped = threading.Event()
+        self.prober = None
+        if len(urls) > 1 and probe_interval > 0:
+            self.prober = threading.Thread(
+                target=self._probe_loop, args=(probe_interval, probe_timeout), name="n8n-probe", daemon=True
+            )
+            self.prober.start()
+
+    def acquire(self, session_id: str = None, exclude=()) -> str:
+        """Reserve an endpoint for one attempt; every acquire() needs a release()."""
+        with self._lock:
+            candidates = [u for u in self.endpoints if u not in exclude] or list(self.endpoints)
+            healthy = [u for u in candidates if self.endpoints[u]["healthy"]] or candidates
+            url = self._sticky.get(session_id)
+            if url in healthy:
+                self._sticky.move_to_end(session_id)
+            else:
+                # Endpoints without samples yet count as the fastest known one, so they get tried
+                known = [e["ewma_ms"] for e in self.endpoints.values() if e["ewma_ms"] is not None]
+                default = min(known, default=1.0)
+                scores = {
+                    u: (self.endpoints[u]["in_flight"] + 1)
+                    * (default if self.endpoints[u]["ewma_ms"] is None else self.endpoints[u]["ewma_ms"])
+                    for u in healthy
+                }
+                best = min(scores.values())
+                url = random.choice([u for u, score in scores.items() if score == best])
+                if session_id is not None:
+                    self._sticky[session_id] = url
+                    self._sticky.move_to_end(session_id)
+                    while len(self._sticky) > self.sticky_max:
+                        self._sticky.popitem(last=False)
+            endpoint = self.endpoints[url]
+            endpoint["in_flight"] += 1
+            endpoint["requests"] += 1
+            return url
+
+    def release(self, url: str, ms: float = None, ok: bool = True):
+        with self._lock:
+            endpoint = self.endpoints[url]
+            endpoint["in_flight"] -= 1
+            if ok:
+                endpoint["failures"] = 0
+                endpoint["healthy"] = True
+                if ms is not None:
+                    prev = endpoint["ewma_ms"]
+                    endpoint["ewma_ms"] = ms if prev is None else prev + self.ALPHA * (ms - prev)
+            else:
+                endpoint["errors"] += 1
+                endpoint["failures"] += 1
+                if endpoint["failures"] >= self.eject_after:
+                    endpoint["healthy"] = False
+
+    def health_url(self, url: str) -> str:
+        parts = urllib.parse.urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}{self.health_path}"
+
+    def _probe_loop(self, interval: float, timeout: float):
+        # Own session: probes must not go through the record adapter or hold pool slots
+        session = requests.Session()
+        while not self._stopped.is_set():
+            for url in list(self.endpoints):
+                try:
+                    ok = session.get(self.health_url(url), timeout=timeout).ok
+                except requests.exceptions.RequestException:
+                    ok = False
+                with self._lock:
+                    endpoint = self.endpoints[url]
+                    endpoint["probed_at"] = time.time()
+                    endpoint["healthy"] = ok
+                    if ok:
+                        endpoint["failures"] = 0
+            self._stopped.wait(interval)
+        session.close()
+
+    def stop(self):
+        """End the health probes (the router still routes)."""
+        self._stopped.set()
+
+    def stats(self) -> list:
+        now = time.time()
+        with self._lock:
+            return [
+                {
+                    "endpoint": urllib.parse.urlsplit(url).netloc,
+                    "healthy": e["healthy"],
+                    "in_flight": e["in_flight"],
+                    "requests": e["requests"],
+                    "errors": e["errors"],
+                    "ewma_ms": None if e["ewma_ms"] is None else round(e["ewma_ms"], 1),
+                    "probed_s_ago": None if e["probed_at"] is None else round(now - e["probed_at"]),
+                }
+                for url, e in self.endpoints.items()
+            ]
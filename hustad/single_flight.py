@@ -0,0 +1,66 @@
+"""Coalesces identical concurrent backend calls into one."""
+import threading
+from concurrent.futures import Future
+
+class _LeaderGaveUp(Exception):
+    pass
+
+class SingleFlight:
+    def __init__(self, gave_up: tuple = ()):
+        # Errors (besides cancellation such as GeneratorExit) meaning the leader never got an answer
+        # for anyone, e.g. it wasn't admitted: a follower re-issues the call instead of failing with it
+        self._gave_up = gave_up
+        self._calls = {}  # key -> Future of the leader's response
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+
+    def join(self, key) -> tuple:
+        """Return (future, is_leader); the leader must report back through finish(), followers read follow()."""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = self._calls[key] = Future()
+            self.leaders += 1
+            return future, True
+
+    def finish(self, key, result: dict = None, error: BaseException = None):
+        with self._lock:
+            future = self._calls.pop(key)
+        if error is None:
+            future.set_result(dict(result))
+        elif not isinstance(error, Exception) or isinstance(error, self._gave_up):
+            future.set_exception(_LeaderGaveUp())
+        else:
+            future.set_exception(error)
+
+    def follow(self, future: Future):
+        """The leader's result (a copy), or None if it gave up: join() again, and one follower takes over."""
+        try:
+            return dict(future.result())
+        except _LeaderGaveUp:
+            with self._lock:
+                self.coalesced -= 1
+            return None
+
+    def do(self, key, fn) -> dict:
+        while True:
+            future, leader = self.join(key)
+            if leader:
+                break
+            result = self.follow(future)
+            if result is not None:
+                return result
+        try:
+            result = fn()
+        except BaseException as e:
+            self.finish(key, error=e)
+            raise
+        self.finish(key, result)
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"in_flight": len(self._calls), "backend_calls": self.leaders, "coalesced": self.coalesced}
@@ -0,0 +1,60 @@
+"""Parsing of streamed n8n replies: SSE or NDJSON events, and the reply text they carry."""
+import json
+
+import requests
+
+# Content types that are always one JSON event per line
+NDJSON_TYPES = {"application/x-ndjson", "application/jsonl", "application/json-seq"}
+
+def iter_text_lines(r: requests.Response):
+    # Not iter_lines(): it splits on str.splitlines() boundaries, and JSON.stringify leaves
+    # U+2028/U+2029/U+0085 raw inside strings. Lines end at \n only (a trailing \r is dropped).
+    pending = ""
+    for chunk in r.iter_content(chunk_size=512, decode_unicode=True):
+        lines = (pending + chunk).split("\n")
+        pending = lines.pop()
+        for line in lines:
+            yield line[:-1] if line.endswith("\r") else line
+    if pending:
+        yield pending
+
+def iter_sse(r: requests.Response):
+    data_lines = []
+    for line in iter_text_lines(r):
+        if line.startswith("data:"):
+            data_lines.append(line[5:].lstrip())
+        elif not line and data_lines:
+            data = "\n".join(data_lines)
+            data_lines = []
+            if data == "[DONE]":
+                return
+            try:
+                yield json.loads(data)
+            except ValueError:
+                yield data
+    if data_lines:
+        yield "\n".join(data_lines)
+
+def iter_ndjson(lines):
+    for line in lines:
+        if not line or not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield line
+
+def chunk_text(event) -> str:
+    if isinstance(event, str):
+        return event
+    if not isinstance(event, dict):
+        return ""
+    if event.get("type") in ("begin", "end", "error"):
+        return ""
+    for key in ("content", "delta", "text", "token", "output"):
+        if isinstance(event.get(key), str):
+            return event[key]
+    return ""
+
+def is_stream_event(event) -> bool:
+    return isinstance(event, dict) and event.get("type") in ("begin", "item", "end")
@@ -0,0 +1,201 @@
+// Neon particle canvas overlay: spatial-grid links, adaptive particle count, pauses when hidden
+(function () {
+  const canvas = document.getElementById("neon-particles");
+  const ctx = canvas.getContext("2d");
+
+  const COLORS = [
+    [255, 0, 255],
+    [0, 255, 255],
+    [0, 255, 136],
+    [255, 122, 0],
+    [127, 0, 255]
+  ];
+
+  function resize() {
+    const dpr = window.devicePixelRatio || 1;
+    canvas.width = Math.floor(window.innerWidth * dpr);
+    canvas.height = Math.floor(window.innerHeight * dpr);
+    canvas.style.width = window.innerWidth + "px";
+    canvas.style.height = window.innerHeight + "px";
+    ctx.setTransform(dpr, 0, 0, dpr, 0, 0);
+  }
+  window.addEventListener("resize", resize);
+  resize();
+
+  const W = () => window.innerWidth;
+  const H = () => window.innerHeight;
+
+  // Settings come from the loader in streamlit_app.py (theme_and_overlay_html)
+  const CONFIG = window.NEON_PARTICLES || {};
+  const N = CONFIG.particleCount || 110;
+  const MIN_N = Math.min(N, CONFIG.minParticles || 30);
+  const MAX_SPEED = CONFIG.maxSpeed || 0.6;
+  const LINK_DIST = CONFIG.linkDistance || 150;
+  const LINK_DIST_SQ = LINK_DIST * LINK_DIST;
+  const ADAPTIVE = CONFIG.adaptive !== false;
+
+  // Frame budget for adaptive quality: shed particles above ~45 fps-equivalent, regrow below ~58
+  const SLOW_MS = 1000 / 45;
+  const FAST_MS = 1000 / 58;
+
+  const particles = [];
+  for (let i = 0; i < N; i++) {
+    const c = COLORS[Math.floor(Math.random() * COLORS.length)];
+    particles.push({
+      x: Math.random() * W(),
+      y: Math.random() * H(),
+      vx: (Math.random() * 2 - 1) * MAX_SPEED,
+      vy: (Math.random() * 2 - 1) * MAX_SPEED,
+      r: 1.2 + Math.random() * 1.9,
+      c
+    });
+  }
+  let active = N;
+
+  let mx = W() / 2, my = H() / 2;
+  window.addEventListener("mousemove", (e) => { mx = e.clientX; my = e.clientY; });
+
+  function rgba(rgb, a) {
+    return "rgba(" + rgb[0] + "," + rgb[1] + "," + rgb[2] + "," + a + ")";
+  }
+
+  // Uniform grid with LINK_DIST cells: a particle can only link to its own cell and the 8 around it
+  const grid = new Map();
+  function buildGrid() {
+    grid.clear();
+    for (let i = 0; i < active; i++) {
+      const p = particles[i];
+      const key = Math.floor(p.x / LINK_DIST) + "," + Math.floor(p.y / LINK_DIST);
+      let cell = grid.get(key);
+      if (!cell) { cell = []; grid.set(key, cell); }
+      cell.push(i);
+    }
+  }
+
+  // Own cell + 4 "forward" neighbours, so every pair is visited exactly once
+  const NEIGHBOURS = [[0, 0], [1, 0], [-1, 1], [0, 1], [1, 1]];
+
+  function link(a, b) {
+    const dx = a.x - b.x;
+    const dy = a.y - b.y;
+    const d2 = dx*dx + dy*dy;
+    if (d2 >= LINK_DIST_SQ) return;
+    const t = 1 - (Math.sqrt(d2) / LINK_DIST);
+    const c = [
+      (a.c[0] + b.c[0]) / 2,
+      (a.c[1] + b.c[1]) / 2,
+      (a.c[2] + b.c[2]) / 2
+    ];
+    ctx.strokeStyle = rgba(c, 0.22 * t);
+    ctx.lineWidth = 1;
+    ctx.beginPath();
+    ctx.moveTo(a.x, a.y);
+    ctx.lineTo(b.x, b.y);
+    ctx.stroke();
+  }
+
+  function drawLinks() {
+    buildGrid();
+    for (const [key, cell] of grid) {
+      const sep = key.indexOf(",");
+      const cx = +key.slice(0, sep);
+      const cy = +key.slice(sep + 1);
+      for (const [ox, oy] of NEIGHBOURS) {
+        const other = (ox === 0 && oy === 0) ? cell : grid.get((cx + ox) + "," + (cy + oy));
+        if (!other) continue;
+        for (let i = 0; i < cell.length; i++) {
+          const a = particles[cell[i]];
+          for (let j = (other === cell ? i + 1 : 0); j < other.length; j++) {
+            link(a, particles[other[j]]);
+          }
+        }
+      }
+    }
+  }
+
+  let frameMs = 1000 / 60;
+  let lastTs = 0;
+  let adjustAt = 0;
+  function adapt(ts) {
+    if (!ADAPTIVE) return;
+    if (lastTs) {
+      // EWMA of frame time; ignore gaps from paused/background frames
+      const dt = ts - lastTs;
+      if (dt < 250) frameMs = frameMs * 0.9 + dt * 0.1;
+    }
+    lastTs = ts;
+    if (ts < adjustAt) return;
+    adjustAt = ts + 1000;
+    if (frameMs > SLOW_MS && active > MIN_N) {
+      active = Math.max(MIN_N, Math.floor(active * 0.8));
+    } else if (frameMs < FAST_MS && active < N) {
+      active = Math.min(N, Math.ceil(active * 1.1));
+    }
+  }
+
+  function step(ts) {
+    adapt(ts || 0);
+    ctx.clearRect(0, 0, W(), H());
+
+    for (let i = 0; i < active; i++) {
+      const p = particles[i];
+      const dxm = mx - p.x;
+      const dym = my - p.y;
+      const distm = Math.sqrt(dxm*dxm + dym*dym) + 0.001;
+      const pull = Math.min(0.018, 0.9 / distm);
+      p.vx += (dxm / distm) * pull * 0.03;
+      p.vy += (dym / distm) * pull * 0.03;
+
+      const sp = Math.sqrt(p.vx*p.vx + p.vy*p.vy) + 0.001;
+      const cap = MAX_SPEED * 1.6;
+      if (sp > cap) {
+        p.vx = (p.vx / sp) * cap;
+        p.vy = (p.vy / sp) * cap;
+      }
+
+      p.x += p.vx;
+      p.y += p.vy;
+
+      if (p.x < 0) { p.x = 0; p.vx *= -1; }
+      if (p.x > W()) { p.x = W(); p.vx *= -1; }
+      if (p.y < 0) { p.y = 0; p.vy *= -1; }
+      if (p.y > H()) { p.y = H(); p.vy *= -1; }
+
+      ctx.beginPath();
+      ctx.fillStyle = rgba(p.c, 0.82);
+      ctx.arc(p.x, p.y, p.r, 0, Math.PI * 2);
+      ctx.fill();
+
+      ctx.beginPath();
+      ctx.fillStyle = "rgba(255,255,255,0.65)";
+      ctx.arc(p.x, p.y, Math.max(0.6, p.r * 0.35), 0, Math.PI * 2);
+      ctx.fill();
+    }
+
+    drawLinks();
+
+    frame = running ? requestAnimationFrame(step) : 0;
+  }
+
+  // Only animate while visible and when the user hasn't asked for reduced motion
+  const reducedMotion = window.matchMedia("(prefers-reduced-motion: reduce)");
+  let running = false;
+  let frame = 0;
+  function sync() {
+    const shouldRun = !document.hidden && !reducedMotion.matches;
+    if (shouldRun && !running) {
+      running = true;
+      lastTs = 0;
+      frame = requestAnimationFrame(step);
+    } else if (!shouldRun && running) {
+      running = false;
+      if (frame) cancelAnimationFrame(frame);
+      frame = 0;
+    }
+  }
+  document.addEventListener("visibilitychange", sync);
+  if (reducedMotion.addEventListener) reducedMotion.addEventListener("change", sync);
+
+  step(0);  // one static frame, then animate if allowed
+  sync();
+})();
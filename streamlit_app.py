@@ -1,8 +1,39 @@
 import streamlit as st
 import streamlit.components.v1 as components
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+import codecs
+import gzip
 import json
-from datetime import datetime
+import itertools
+import hashlib
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict, deque
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+
+from hustad.admission import Admission, NotAdmitted, Ticket
+from hustad.conversations import ConversationStore
+from hustad.health import BackendHealth, BackendUnavailable
+from hustad.hedging import first_success, submit_hedge
+from hustad.response_cache import PROMPT_INTENTS, ResponseCache, classify_prompt, normalize_prompt
+from hustad.routing import EndpointRouter
+from hustad.single_flight import SingleFlight
+from hustad.streaming import NDJSON_TYPES, chunk_text, is_stream_event, iter_ndjson, iter_sse, iter_text_lines
+
+# Startup profile: the clock starts after the imports (Streamlit keeps imported modules from the first run on)
+config_started = time.perf_counter()
 
 # ----------------------------
 # Config
@@ -14,333 +45,270 @@ st.set_page_config(
     initial_sidebar_state="expanded",
 )
 
-N8N_WEBHOOK_URL = st.secrets.get("N8N_WEBHOOK_URL", "")
+# Backend mode: "live", "record" (live + append every exchange to the cassette) or "replay" (cassette only, no network)
+N8N_BACKEND_MODE = st.secrets.get("N8N_BACKEND_MODE", "live")
+N8N_CASSETTE_PATH = st.secrets.get("N8N_CASSETTE_PATH", "n8n_cassette.jsonl")
+# Replay timing: 1 = recorded latencies, 0 = full speed
+N8N_REPLAY_LATENCY_SCALE = float(st.secrets.get("N8N_REPLAY_LATENCY_SCALE", 0))
+
+# More n8n instances behind the same workflow (list or comma-separated); N8N_WEBHOOK_URL, if set, is one of them
+N8N_WEBHOOK_URLS = st.secrets.get("N8N_WEBHOOK_URLS", [])
+if isinstance(N8N_WEBHOOK_URLS, str):
+    N8N_WEBHOOK_URLS = N8N_WEBHOOK_URLS.split(",")
+N8N_WEBHOOK_URLS = tuple(
+    dict.fromkeys(u.strip() for u in [st.secrets.get("N8N_WEBHOOK_URL", ""), *N8N_WEBHOOK_URLS] if u.strip())
+)
+# Replay never touches the network, so any URL will do when none is configured
+if not N8N_WEBHOOK_URLS and N8N_BACKEND_MODE == "replay":
+    N8N_WEBHOOK_URLS = ("http://n8n-replay.invalid/webhook",)
+N8N_WEBHOOK_URL = N8N_WEBHOOK_URLS[0] if N8N_WEBHOOK_URLS else ""
+
+# Endpoint health: consecutive failures that take an endpoint out of rotation, and background probes of
+# <scheme://host>N8N_HEALTH_PATH that eject/restore endpoints (only with several endpoints; 0 = no probes)
+N8N_EJECT_AFTER = int(st.secrets.get("N8N_EJECT_AFTER", 3))
+N8N_HEALTH_PATH = st.secrets.get("N8N_HEALTH_PATH", "/healthz")
+N8N_HEALTH_INTERVAL = float(st.secrets.get("N8N_HEALTH_INTERVAL", 10))
+
+# HTTP client tuning (all optional secrets)
+N8N_POOL_SIZE = int(st.secrets.get("N8N_POOL_SIZE", 20))
+N8N_KEEP_ALIVE = bool(st.secrets.get("N8N_KEEP_ALIVE", True))
+N8N_CONNECT_TIMEOUT = float(st.secrets.get("N8N_CONNECT_TIMEOUT", 5))
+N8N_READ_TIMEOUT = float(st.secrets.get("N8N_READ_TIMEOUT", 120))
+
+# Compression: "auto" accepts gzip (+ zstd when urllib3 can decode it), "gzip", or "off";
+# request bodies of at least N8N_COMPRESS_MIN_BYTES are gzipped unless off ("auto" falls back to
+# plain bodies for an endpoint that rejects them)
+N8N_COMPRESSION = st.secrets.get("N8N_COMPRESSION", "auto")
+N8N_COMPRESS_MIN_BYTES = int(st.secrets.get("N8N_COMPRESS_MIN_BYTES", 1024))
+
+# Resilience: retries (lookups only), hedged second request after the p95 latency, circuit breaker
+N8N_RETRIES = int(st.secrets.get("N8N_RETRIES", 2))
+N8N_RETRY_BACKOFF = float(st.secrets.get("N8N_RETRY_BACKOFF", 0.3))
+N8N_HEDGE = bool(st.secrets.get("N8N_HEDGE", False))
+N8N_HEDGE_MIN_SAMPLES = int(st.secrets.get("N8N_HEDGE_MIN_SAMPLES", 20))
+N8N_BREAKER_THRESHOLD = int(st.secrets.get("N8N_BREAKER_THRESHOLD", 5))
+N8N_BREAKER_RESET_SECONDS = float(st.secrets.get("N8N_BREAKER_RESET_SECONDS", 30))
+
+# Response cache: max entries + TTL (seconds) per intent; 0 = never cached
+CACHE_MAX_ENTRIES = int(st.secrets.get("N8N_CACHE_MAX_ENTRIES", 256))
+CACHE_TTLS = {"tickets": 30, "property": 300, "other": 0, **st.secrets.get("N8N_CACHE_TTLS", {})}
+
+# Background backend calls: worker threads shared by all sessions, chat poll interval, prompts in flight per batch
+N8N_WORKERS = int(st.secrets.get("N8N_WORKERS", 8))
+JOB_POLL_SECONDS = float(st.secrets.get("JOB_POLL_SECONDS", 0.25))
+# How often the Overview card and the sidebar rerun counter catch up with changes made elsewhere
+PANEL_REFRESH_SECONDS = float(st.secrets.get("PANEL_REFRESH_SECONDS", 2))
+N8N_BATCH_CONCURRENCY = int(st.secrets.get("N8N_BATCH_CONCURRENCY", 4))
+
+# Admission control: n8n executions in flight across all sessions, per-user token bucket (calls per minute,
+# up to N8N_USER_BURST saved up; 0 = no per-user limit; per browser while everyone is DEFAULT_USER_ID),
+# and jobs that may wait in priority order (chat > Quick actions > prefetch)
+N8N_MAX_IN_FLIGHT = int(st.secrets.get("N8N_MAX_IN_FLIGHT", N8N_WORKERS))
+N8N_USER_RATE = float(st.secrets.get("N8N_USER_RATE", 20))
+N8N_USER_BURST = int(st.secrets.get("N8N_USER_BURST", 5))
+N8N_QUEUE_SIZE = int(st.secrets.get("N8N_QUEUE_SIZE", 64))
+
+# Speculative prefetch of Quick action lookups (opt-in): per-user budget per hour + min gap between rounds
+N8N_PREFETCH = bool(st.secrets.get("N8N_PREFETCH", False))
+N8N_PREFETCH_BUDGET = int(st.secrets.get("N8N_PREFETCH_BUDGET", 30))
+N8N_PREFETCH_IDLE_SECONDS = float(st.secrets.get("N8N_PREFETCH_IDLE_SECONDS", 20))
+
+# Conversation store: SQLite file + how many turns a session keeps loaded
+CHAT_DB_PATH = st.secrets.get("CHAT_DB_PATH", "chat_history.sqlite3")
+HISTORY_PAGE_SIZE = int(st.secrets.get("HISTORY_PAGE_SIZE", 50))
+HISTORY_MAX_LOADED = int(st.secrets.get("HISTORY_MAX_LOADED", 500))
+CHAT_RENDER_WINDOW = int(st.secrets.get("CHAT_RENDER_WINDOW", 20))
+
+# List-shaped results: shown as a table from this many rows, paged server-side; parsed tables kept in memory
+TABLE_MIN_ROWS = int(st.secrets.get("TABLE_MIN_ROWS", 2))
+TABLE_PAGE_SIZE = int(st.secrets.get("TABLE_PAGE_SIZE", 25))
+TABLE_CACHE_ENTRIES = int(st.secrets.get("TABLE_CACHE_ENTRIES", 32))
+
+# Raw n8n payloads (debug view): blob store location (":memory:" keeps it in RAM) + retention
+BLOB_STORE_PATH = st.secrets.get("BLOB_STORE_PATH", CHAT_DB_PATH)
+BLOB_MAX_BYTES = int(st.secrets.get("BLOB_MAX_BYTES", 256 * 1024 * 1024))
+BLOB_MAX_AGE_DAYS = float(st.secrets.get("BLOB_MAX_AGE_DAYS", 30))
+
+# Debug viewer: items / string chars shown per level, and preview bytes sent per rerun across all payloads
+DEBUG_PREVIEW_ITEMS = int(st.secrets.get("DEBUG_PREVIEW_ITEMS", 20))
+DEBUG_PREVIEW_CHARS = int(st.secrets.get("DEBUG_PREVIEW_CHARS", 200))
+DEBUG_BYTES_PER_RERUN = int(st.secrets.get("DEBUG_BYTES_PER_RERUN", 256 * 1024))
+
+# Instrumentation: samples kept per stage + optional export file (.json or Prometheus text)
+METRICS_WINDOW = int(st.secrets.get("METRICS_WINDOW", 2048))
+METRICS_EXPORT_PATH = st.secrets.get("METRICS_EXPORT_PATH", "")
+METRICS_EXPORT_SECONDS = float(st.secrets.get("METRICS_EXPORT_SECONDS", 15))
+
+# Session registry: sessions idle this long (seconds) or beyond the cap release their cached turns
+SESSION_IDLE_TTL = float(st.secrets.get("SESSION_IDLE_TTL", 3600))
+SESSION_MAX = int(st.secrets.get("SESSION_MAX", 1000))
+SESSION_ID_PATTERN = re.compile(r"[\w-]{8,64}")
+# Cookie holding the per-browser key that owns the sessions it starts
+BROWSER_COOKIE = "hustad_browser"
+# Every session starts as this user until sign-in exists
+DEFAULT_USER_ID = "aminul@hustadcompanies.com"
+
+# Startup profile: wall time per top-level section of every full run, shown on the Performance page
+STARTUP_PROFILE = bool(st.secrets.get("STARTUP_PROFILE", False))
 
 # ----------------------------
-# Level 11 Cyberpunk Styling (Background + Grid + Scanlines + Neon Buttons)
+# Instrumentation (per-stage timings + payload sizes in a bounded ring buffer per process)
 # ----------------------------
-st.markdown(
-    """
-    <style>
-    /* =====================================================
-       🔥 LEVEL 11: CYBERPUNK HOLOGRAPHIC OVERDRIVE
-       ===================================================== */
-
-    :root{
-      --pink: #ff00ff;
-      --cyan: #00ffff;
-      --mint: #00ff88;
-      --amber:#ff7a00;
-      --violet:#7f00ff;
-
-      --stroke: rgba(255,255,255,.18);
-      --stroke2: rgba(255,255,255,.28);
-    }
-
-    /* Streamlit base paddings */
-    .block-container { padding-top: 1.25rem; padding-bottom: 2rem; }
-
-    html, body, [data-testid="stAppViewContainer"]{
-      height: 100%;
-      overflow-x: hidden;
-      background:
-        radial-gradient(circle at 12% 18%, rgba(255,0,255,.55), transparent 42%),
-        radial-gradient(circle at 85% 14%, rgba(0,255,255,.50), transparent 46%),
-        radial-gradient(circle at 20% 88%, rgba(0,255,140,.42), transparent 52%),
-        radial-gradient(circle at 88% 82%, rgba(255,120,0,.40), transparent 54%),
-        radial-gradient(circle at 55% 45%, rgba(127,0,255,.30), transparent 60%),
-        linear-gradient(180deg, #02020a 0%, #050514 45%, #020208 100%);
-      background-attachment: fixed;
-    }
-
-    /* ===== Glow field (z=0) ===== */
-    [data-testid="stAppViewContainer"]::before{
-      content:"";
-      position: fixed;
-      inset:-55%;
-      pointer-events:none;
-      background:
-        radial-gradient(circle at 20% 25%, rgba(255,0,255,.40), transparent 40%),
-        radial-gradient(circle at 70% 25%, rgba(0,255,255,.40), transparent 45%),
-        radial-gradient(circle at 30% 80%, rgba(0,255,140,.32), transparent 52%),
-        radial-gradient(circle at 85% 75%, rgba(255,120,0,.30), transparent 52%),
-        radial-gradient(circle at 55% 55%, rgba(127,0,255,.25), transparent 60%);
-      filter: blur(75px);
-      animation: auroraFloat 10s ease-in-out infinite alternate;
-      z-index: 0;
-    }
-
-    @keyframes auroraFloat{
-      0%   { transform: translate(-6%, -4%) scale(1.05) rotate(0deg); }
-      50%  { transform: translate(6%, 5%)   scale(1.18) rotate(7deg); }
-      100% { transform: translate(10%, -7%) scale(1.25) rotate(-7deg); }
-    }
-
-    /* ===== Tron grid floor (z=0) ===== */
-    [data-testid="stAppViewContainer"]::after{
-      content:"";
-      position: fixed;
-      left:0; right:0;
-      bottom:-35vh;
-      height: 70vh;
-      pointer-events:none;
-      background:
-        linear-gradient(to top, rgba(0,255,255,.24), rgba(0,0,0,0) 60%),
-        repeating-linear-gradient(
-          90deg,
-          rgba(0,255,255,.18) 0px,
-          rgba(0,255,255,.18) 1px,
-          rgba(0,0,0,0) 1px,
-          rgba(0,0,0,0) 38px
-        ),
-        repeating-linear-gradient(
-          0deg,
-          rgba(255,0,255,.16) 0px,
-          rgba(255,0,255,.16) 1px,
-          rgba(0,0,0,0) 1px,
-          rgba(0,0,0,0) 42px
-        );
-      transform-origin: bottom;
-      transform: perspective(900px) rotateX(62deg);
-      filter: blur(.2px);
-      opacity: .75;
-      animation: gridPulse 2.8s ease-in-out infinite alternate;
-      z-index: 0;
-    }
-
-    @keyframes gridPulse{
-      0%   { opacity: .55; }
-      100% { opacity: .85; }
-    }
-
-    /* Keep Streamlit content above FX layers */
-    [data-testid="stAppViewContainer"] > .main{
-      position: relative;
-      z-index: 2;
-    }
-
-    /* ===== Scanlines + flicker (z=3) ===== */
-    body::before{
-      content:"";
-      position: fixed;
-      inset: 0;
-      pointer-events:none;
-      background:
-        repeating-linear-gradient(
-          to bottom,
-          rgba(255,255,255,.05) 0px,
-          rgba(255,255,255,.05) 1px,
-          rgba(0,0,0,0) 3px,
-          rgba(0,0,0,0) 6px
-        );
-      mix-blend-mode: overlay;
-      opacity: .10;
-      z-index: 3;
-      animation: scanFlicker 6s ease-in-out infinite;
-    }
-
-    @keyframes scanFlicker{
-      0%, 100% { opacity: .08; }
-      50%      { opacity: .13; }
-    }
-
-    /* ===== Sparkle texture (z=3) ===== */
-    body::after{
-      content:"";
-      position: fixed;
-      inset: 0;
-      pointer-events:none;
-      background-image:
-        radial-gradient(rgba(255,255,255,.35) 1px, transparent 1px),
-        radial-gradient(rgba(0,255,255,.25) 1px, transparent 1px),
-        radial-gradient(rgba(255,0,255,.18) 1px, transparent 1px);
-      background-size: 120px 120px, 180px 180px, 240px 240px;
-      background-position: 0 0, 40px 70px, 90px 30px;
-      opacity: .08;
-      z-index: 3;
-      animation: sparkleDrift 14s linear infinite;
-    }
-
-    @keyframes sparkleDrift{
-      0%   { transform: translate(0,0); }
-      100% { transform: translate(-120px, -180px); }
-    }
-
-    /* Sidebar hologlass */
-    [data-testid="stSidebar"]{
-      background: rgba(6,8,18,.78) !important;
-      backdrop-filter: blur(20px);
-      border-right: 1px solid var(--stroke) !important;
-      box-shadow:
-        0 0 25px rgba(0,255,255,.14),
-        0 0 40px rgba(255,0,255,.10);
-    }
-
-    /* Topbar + Cards */
-    .topbar, .card{
-      background: linear-gradient(135deg, rgba(255,255,255,.07), rgba(255,255,255,.03)) !important;
-      border: 1px solid var(--stroke2) !important;
-      backdrop-filter: blur(18px);
-      border-radius: 14px;
-      box-shadow:
-        0 0 18px rgba(255,0,255,.14),
-        0 0 22px rgba(0,255,255,.12),
-        inset 0 0 0 1px rgba(255,255,255,.08);
-      position: relative;
-      overflow: hidden;
-    }
-
-    .topbar::before, .card::before{
-      content:"";
-      position:absolute;
-      inset:-40%;
-      background: linear-gradient(
-        90deg,
-        rgba(255,0,255,.0),
-        rgba(0,255,255,.22),
-        rgba(0,255,140,.18),
-        rgba(255,120,0,.16),
-        rgba(255,0,255,.0)
-      );
-      transform: rotate(10deg);
-      filter: blur(18px);
-      opacity: .0;
-      animation: holoSweep 5.2s ease-in-out infinite;
-      pointer-events:none;
-    }
-
-    @keyframes holoSweep{
-      0%   { transform: translateX(-20%) rotate(10deg); opacity: 0; }
-      35%  { opacity: .55; }
-      60%  { opacity: .35; }
-      100% { transform: translateX(20%) rotate(10deg); opacity: 0; }
-    }
-
-    /* Animated gradient header text */
-    .brand, h1, h2, h3{
-      background: linear-gradient(90deg, var(--pink), var(--cyan), var(--mint), var(--amber), var(--violet), var(--pink));
-      background-size: 300% 100%;
-      -webkit-background-clip: text;
-      background-clip: text;
-      color: transparent !important;
-      animation: textFlow 4s linear infinite;
-      text-shadow:
-        0 0 12px rgba(255,0,255,.22),
-        0 0 14px rgba(0,255,255,.18);
-    }
-
-    @keyframes textFlow{
-      0%   { background-position: 0% 50%; }
-      100% { background-position: 100% 50%; }
-    }
-
-    /* Chips + subtle text */
-    .chip {
-      display:inline-flex; align-items:center; gap:.45rem;
-      padding: .25rem .55rem; border-radius: 999px;
-      border: 1px solid rgba(255,255,255,0.18);
-      background: rgba(255,255,255,0.06);
-      font-size: .82rem;
-      color: rgba(255,255,255,0.80);
-      box-shadow: 0 0 14px rgba(0,255,255,.10);
-    }
-    .subtle { color: rgba(255,255,255,0.72); font-size: 0.9rem; }
-    .tiny { font-size: 0.82rem; color: rgba(255,255,255,0.72); }
-    .divider { height:1px; background: rgba(255,255,255,0.12); margin: .75rem 0; }
-
-    /* ULTRA NEON buttons */
-    div.stButton > button{
-      border-radius: 999px !important;
-      border: 1px solid rgba(255,255,255,.28) !important;
-      background: rgba(255,255,255,.09) !important;
-      color: white !important;
-      padding: .70rem 1.25rem !important;
-      font-weight: 700 !important;
-      letter-spacing: .4px;
-      transition: transform .16s ease, box-shadow .2s ease, background .2s ease, border-color .2s ease;
-      position: relative;
-      overflow: hidden;
-      box-shadow: 0 0 0 rgba(0,0,0,0);
-    }
-
-    div.stButton > button::before{
-      content:"";
-      position:absolute;
-      inset:-3px;
-      background: linear-gradient(90deg, var(--pink), var(--cyan), var(--mint), var(--amber), var(--violet), var(--pink));
-      background-size: 320% 320%;
-      filter: blur(14px);
-      opacity: 0;
-      transition: opacity .18s ease;
-      animation: auraFlow 3.2s linear infinite;
-      z-index: 0;
-      pointer-events:none;
-    }
-
-    @keyframes auraFlow{
-      0%   { background-position: 0% 50%; }
-      100% { background-position: 100% 50%; }
-    }
-
-    div.stButton > button > div{
-      position: relative;
-      z-index: 1;
-    }
-
-    div.stButton > button:hover{
-      transform: translateY(-3px) scale(1.05);
-      border-color: rgba(255,255,255,.65) !important;
-      background: rgba(255,255,255,.14) !important;
-      box-shadow:
-        0 0 22px rgba(255,0,255,.55),
-        0 0 32px rgba(0,255,255,.42),
-        0 0 44px rgba(0,255,140,.30),
-        0 0 70px rgba(255,120,0,.24);
-    }
-
-    div.stButton > button:hover::before{
-      opacity: 1;
-    }
-
-    div.stButton > button:active{
-      transform: translateY(0px) scale(.98);
-      box-shadow:
-        0 0 18px rgba(255,0,255,.42),
-        0 0 24px rgba(0,255,255,.30);
-    }
-
-    /* Chat bubble glow */
-    [data-testid="stChatMessage"]{
-      background: rgba(255,255,255,.05);
-      border: 1px solid var(--stroke2);
-      border-radius: 18px;
-      backdrop-filter: blur(14px);
-      box-shadow:
-        0 0 14px rgba(255,0,255,.16),
-        0 0 18px rgba(0,255,255,.14);
-    }
-
-    /* Scrollbar neon */
-    ::-webkit-scrollbar { width: 9px; }
-    ::-webkit-scrollbar-thumb{
-      background: linear-gradient(var(--pink), var(--cyan), var(--mint));
-      border-radius: 12px;
-      box-shadow: 0 0 14px rgba(0,255,255,.35);
-    }
-    </style>
-    """,
-    unsafe_allow_html=True,
-)
+run_started = time.perf_counter()
+# (section, start) of this run's top-level sections; recorded as "startup:<section>" stages at the end
+profile_marks = [("config", config_started), ("definitions", run_started)]
+
+def profile_section(name: str):
+    profile_marks.append((name, time.perf_counter()))
+
+class Metrics:
+    QUANTILES = (0.5, 0.95, 0.99)
+
+    def __init__(self, window: int):
+        self.window = window
+        self._samples = {}  # stage -> deque of (ms, bytes_sent, bytes_received)
+        self._totals = {}  # stage -> [count, ms, bytes_sent, bytes_received] since start
+        self._lock = threading.Lock()
+        self._exported_at = 0.0
+
+    def record(self, stage: str, ms: float, sent: int = 0, received: int = 0):
+        with self._lock:
+            samples = self._samples.get(stage)
+            if samples is None:
+                samples = self._samples[stage] = deque(maxlen=self.window)
+                self._totals[stage] = [0, 0.0, 0, 0]
+            samples.append((ms, sent, received))
+            totals = self._totals[stage]
+            totals[0] += 1
+            totals[1] += ms
+            totals[2] += sent
+            totals[3] += received
+
+    @contextmanager
+    def timer(self, stage: str):
+        """Time a block; the yielded dict can carry "sent"/"received" byte counts."""
+        sizes = {}
+        started = time.perf_counter()
+        try:
+            yield sizes
+        finally:
+            self.record(stage, (time.perf_counter() - started) * 1000, sizes.get("sent", 0), sizes.get("received", 0))
+
+    def samples(self, stage: str) -> list:
+        with self._lock:
+            return [ms for ms, _, _ in self._samples.get(stage, ())]
+
+    def summary(self) -> dict:
+        """Per stage: percentiles over the window, totals since the process started."""
+        with self._lock:
+            snapshot = {stage: (sorted(ms for ms, _, _ in samples), list(self._totals[stage])) for stage, samples in self._samples.items()}
+        out = {}
+        for stage, (ms, (count, total_ms, sent, received)) in sorted(snapshot.items()):
+            out[stage] = {
+                "count": count,
+                "window": len(ms),
+                **{f"p{round(q * 100)}": ms[min(len(ms) - 1, int(q * len(ms)))] for q in self.QUANTILES},
+                "mean": total_ms / count,
+                "bytes_sent": sent,
+                "bytes_received": received,
+            }
+        return out
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self._totals.clear()
+
+    def to_json(self) -> str:
+        return json.dumps({"generated_at": time.time(), "stages": self.summary()}, indent=2)
+
+    def to_prometheus(self) -> str:
+        lines = [
+            "# HELP hustad_stage_latency_ms Stage latency in milliseconds (quantiles over the recent window).",
+            "# TYPE hustad_stage_latency_ms summary",
+        ]
+        summary = self.summary()
+        for stage, row in summary.items():
+            for q in self.QUANTILES:
+                lines.append(f'hustad_stage_latency_ms{{stage="{stage}",quantile="{q}"}} {row[f"p{round(q * 100)}"]:.3f}')
+            lines.append(f'hustad_stage_latency_ms_sum{{stage="{stage}"}} {row["mean"] * row["count"]:.3f}')
+            lines.append(f'hustad_stage_latency_ms_count{{stage="{stage}"}} {row["count"]}')
+        lines += ["# HELP hustad_stage_bytes_total Payload bytes per stage.", "# TYPE hustad_stage_bytes_total counter"]
+        for stage, row in summary.items():
+            lines.append(f'hustad_stage_bytes_total{{stage="{stage}",direction="sent"}} {row["bytes_sent"]}')
+            lines.append(f'hustad_stage_bytes_total{{stage="{stage}",direction="received"}} {row["bytes_received"]}')
+        return "\n".join(lines) + "\n"
+
+    def export(self, path: str, every: float):
+        """Write the summary to `path` at most every `every` seconds (format picked by extension)."""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._exported_at < every:
+                return
+            self._exported_at = now
+        body = self.to_json() if path.endswith(".json") else self.to_prometheus()
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            f.write(body)
+        os.replace(tmp, path)
+
+@st.cache_resource
+def get_metrics(window: int) -> Metrics:
+    return Metrics(window)
+
+def metrics() -> Metrics:
+    return get_metrics(METRICS_WINDOW)
+
+@st.cache_resource
+def get_startup_profiles() -> dict:
+    # "cold": the process's first full run (imports not cached yet), "last": the latest one
+    return {}
+
+def record_startup_profile():
+    ends = [start for _, start in profile_marks[1:]] + [time.perf_counter()]
+    profile = [(section, (end - start) * 1000) for (section, start), end in zip(profile_marks, ends)]
+    for section, ms in profile:
+        metrics().record(f"startup:{section}", ms)
+    profiles = get_startup_profiles()
+    profiles.setdefault("cold", profile)
+    profiles["last"] = profile
 
 # ----------------------------
-# Neon particle canvas overlay (FIXED: no f-string braces issues)
+# Theme + neon particle overlay
+# Both live in ./static (served via server.enableStaticServing) under a content-hashed URL.
+# A tiny loader iframe pulls them in once per browser session: its HTML only changes with the
+# FX setting (and the per-browser key it sets as a cookie), so reruns neither re-send the stylesheet
+# nor rebuild the overlay.
 # ----------------------------
-def neon_particles_overlay(
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+
+@st.cache_resource
+def static_asset_url(name: str) -> str:
+    with open(os.path.join(STATIC_DIR, name), "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()[:12]
+    return f"app/static/{name}?v={digest}"
+
+def theme_and_overlay_html(
+    particles: bool = True,
     particle_count: int = 110,
     max_speed: float = 0.60,
     link_distance: int = 150,
     opacity: float = 0.70,
-):
+    min_particles: int = 30,
+    adaptive: bool = True,
+    browser_key: str = "",
+) -> str:
+    config = None
+    if particles:
+        config = {
+            "src": static_asset_url("neon_particles.js"),
+            "particleCount": int(particle_count),
+            "maxSpeed": float(max_speed),
+            "linkDistance": int(link_distance),
+            "minParticles": int(min_particles),
+            "adaptive": bool(adaptive),
+        }
+
     html = """
     <style>
       #neon-particles-wrap {
@@ -364,172 +332,726 @@ def neon_particles_overlay(
 
     <script>
       (function () {
-        const canvas = document.getElementById("neon-particles");
-        const ctx = canvas.getContext("2d");
-
-        const COLORS = [
-          [255, 0, 255],
-          [0, 255, 255],
-          [0, 255, 136],
-          [255, 122, 0],
-          [127, 0, 255]
-        ];
-
-        function resize() {
-          const dpr = window.devicePixelRatio || 1;
-          canvas.width = Math.floor(window.innerWidth * dpr);
-          canvas.height = Math.floor(window.innerHeight * dpr);
-          canvas.style.width = window.innerWidth + "px";
-          canvas.style.height = window.innerHeight + "px";
-          ctx.setTransform(dpr, 0, 0, dpr, 0, 0);
-        }
-        window.addEventListener("resize", resize);
-        resize();
-
-        const W = () => window.innerWidth;
-        const H = () => window.innerHeight;
-
-        const N = __PARTICLE_COUNT__;
-        const MAX_SPEED = __MAX_SPEED__;
-        const LINK_DIST = __LINK_DISTANCE__;
-
-        const particles = [];
-        for (let i = 0; i < N; i++) {
-          const c = COLORS[Math.floor(Math.random() * COLORS.length)];
-          particles.push({
-            x: Math.random() * W(),
-            y: Math.random() * H(),
-            vx: (Math.random() * 2 - 1) * MAX_SPEED,
-            vy: (Math.random() * 2 - 1) * MAX_SPEED,
-            r: 1.2 + Math.random() * 1.9,
-            c
+        const THEME = "__THEME__";
+        const PARTICLES = __PARTICLES__;
+        const BROWSER = __BROWSER__;
+
+        // fetch + inline instead of <link>/<script src>: some Streamlit versions serve
+        // app/static css/js as text/plain, which browsers refuse to apply
+        function load(url) {
+          return fetch(url).then((r) => {
+            if (!r.ok) throw new Error(url + ": " + r.status);
+            return r.text();
           });
         }
 
-        let mx = W() / 2, my = H() / 2;
-        window.addEventListener("mousemove", (e) => { mx = e.clientX; my = e.clientY; });
+        // The stylesheet goes into the app document once; Streamlit doesn't manage <head>
+        const doc = window.parent.document;
 
-        function rgba(rgb, a) {
-          return "rgba(" + rgb[0] + "," + rgb[1] + "," + rgb[2] + "," + a + ")";
+        // Session ownership: the server reads this cookie when the browser reconnects
+        if (BROWSER && !doc.cookie.split("; ").some((c) => c.startsWith("__COOKIE__="))) {
+          doc.cookie = "__COOKIE__=" + BROWSER + "; path=/; max-age=31536000; SameSite=Lax";
         }
-
-        function step() {
-          ctx.clearRect(0, 0, W(), H());
-
-          for (const p of particles) {
-            const dxm = mx - p.x;
-            const dym = my - p.y;
-            const distm = Math.sqrt(dxm*dxm + dym*dym) + 0.001;
-            const pull = Math.min(0.018, 0.9 / distm);
-            p.vx += (dxm / distm) * pull * 0.03;
-            p.vy += (dym / distm) * pull * 0.03;
-
-            const sp = Math.sqrt(p.vx*p.vx + p.vy*p.vy) + 0.001;
-            const cap = MAX_SPEED * 1.6;
-            if (sp > cap) {
-              p.vx = (p.vx / sp) * cap;
-              p.vy = (p.vy / sp) * cap;
-            }
-
-            p.x += p.vx;
-            p.y += p.vy;
-
-            if (p.x < 0) { p.x = 0; p.vx *= -1; }
-            if (p.x > W()) { p.x = W(); p.vx *= -1; }
-            if (p.y < 0) { p.y = 0; p.vy *= -1; }
-            if (p.y > H()) { p.y = H(); p.vy *= -1; }
-
-            ctx.beginPath();
-            ctx.fillStyle = rgba(p.c, 0.82);
-            ctx.arc(p.x, p.y, p.r, 0, Math.PI * 2);
-            ctx.fill();
-
-            ctx.beginPath();
-            ctx.fillStyle = "rgba(255,255,255,0.65)";
-            ctx.arc(p.x, p.y, Math.max(0.6, p.r * 0.35), 0, Math.PI * 2);
-            ctx.fill();
-          }
-
-          for (let i = 0; i < particles.length; i++) {
-            for (let j = i + 1; j < particles.length; j++) {
-              const a = particles[i];
-              const b = particles[j];
-              const dx = a.x - b.x;
-              const dy = a.y - b.y;
-              const d = Math.sqrt(dx*dx + dy*dy);
-              if (d < LINK_DIST) {
-                const t = 1 - (d / LINK_DIST);
-                const c = [
-                  (a.c[0] + b.c[0]) / 2,
-                  (a.c[1] + b.c[1]) / 2,
-                  (a.c[2] + b.c[2]) / 2
-                ];
-                ctx.strokeStyle = rgba(c, 0.22 * t);
-                ctx.lineWidth = 1;
-                ctx.beginPath();
-                ctx.moveTo(a.x, a.y);
-                ctx.lineTo(b.x, b.y);
-                ctx.stroke();
-              }
-            }
-          }
-
-          requestAnimationFrame(step);
+        const current = doc.getElementById("hustad-theme");
+        if (!current || current.dataset.src !== THEME) {
+          load(THEME).then((css) => {
+            const style = current || doc.createElement("style");
+            style.id = "hustad-theme";
+            style.dataset.src = THEME;
+            style.textContent = css;
+            if (!current) doc.head.appendChild(style);
+          }).catch(console.error);
         }
 
-        step();
+        if (PARTICLES) {
+          window.NEON_PARTICLES = PARTICLES;
+          load(PARTICLES.src).then((code) => {
+            const script = document.createElement("script");
+            script.textContent = code;
+            document.body.appendChild(script);
+          }).catch(console.error);
+        }
       })();
     </script>
     """
 
-    html = (
-        html.replace("__PARTICLE_COUNT__", str(int(particle_count)))
-            .replace("__MAX_SPEED__", str(float(max_speed)))
-            .replace("__LINK_DISTANCE__", str(int(link_distance)))
+    return (
+        html.replace("__THEME__", static_asset_url("theme.css"))
+            .replace("__PARTICLES__", json.dumps(config))
             .replace("__OPACITY__", str(float(opacity)))
+            .replace("__BROWSER__", json.dumps(browser_key))
+            .replace("__COOKIE__", BROWSER_COOKIE)
     )
 
-    components.html(html, height=0, width=0)
+# Quality presets for the Settings "Background effects" choice
+FX_PRESETS = {
+    "full": {},
+    "lite": {"particle_count": 45, "link_distance": 110, "min_particles": 15},
+}
 
-# Call once (top-level)
-neon_particles_overlay()
+# ----------------------------
+# Debug payload store (raw n8n responses, content-addressed + zlib-compressed)
+# ----------------------------
+BLOB_SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    hash TEXT PRIMARY KEY,
+    data BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    stored_size INTEGER NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_blobs_last_access ON blobs (last_access);
+"""
+
+class BlobStore:
+    EVICT_EVERY = 100  # puts between retention passes
+
+    def __init__(self, path: str, max_bytes: int, max_age_days: float):
+        self.max_bytes = max_bytes
+        self.max_age = max_age_days * 86400
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._puts = 0
+        with self._lock, self._conn:
+            self._conn.executescript(BLOB_SCHEMA)
+
+    def put(self, obj) -> str:
+        """Store a JSON-able payload and return its sha256 reference; identical payloads are stored once."""
+        body = json.dumps(obj, sort_keys=True, separators=(",", ":"), default=str).encode()
+        ref = hashlib.sha256(body).hexdigest()
+        data = zlib.compress(body, 6)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO blobs (hash, data, size, stored_size, last_access) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(hash) DO UPDATE SET last_access = excluded.last_access",
+                (ref, data, len(body), len(data), time.time()),
+            )
+            self._puts += 1
+            if self._puts % self.EVICT_EVERY == 0:
+                self._evict()
+        return ref
+
+    def get(self, ref: str):
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT data FROM blobs WHERE hash = ?", (ref,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE blobs SET last_access = ? WHERE hash = ?", (time.time(), ref))
+        return json.loads(zlib.decompress(row[0]))
+
+    def info(self, ref: str):
+        with self._lock:
+            row = self._conn.execute("SELECT size, stored_size FROM blobs WHERE hash = ?", (ref,)).fetchone()
+        return {"size": row[0], "stored_size": row[1]} if row else None
+
+    def _evict(self):
+        # Drop blobs unread for max_age, then least recently used until under max_bytes
+        self._conn.execute("DELETE FROM blobs WHERE last_access < ?", (time.time() - self.max_age,))
+        total = self._conn.execute("SELECT COALESCE(SUM(stored_size), 0) FROM blobs").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for ref, stored_size in self._conn.execute("SELECT hash, stored_size FROM blobs ORDER BY last_access").fetchall():
+            self._conn.execute("DELETE FROM blobs WHERE hash = ?", (ref,))
+            total -= stored_size
+            if total <= self.max_bytes:
+                break
+
+    def evict(self):
+        with self._lock, self._conn:
+            self._evict()
+
+    def stats(self) -> dict:
+        with self._lock:
+            count, size, stored = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(stored_size), 0) FROM blobs"
+            ).fetchone()
+        return {"blobs": count, "size": size, "stored_size": stored}
+
+@st.cache_resource
+def get_blob_store(path: str, max_bytes: int, max_age_days: float) -> BlobStore:
+    return BlobStore(path, max_bytes, max_age_days)
+
+def blob_store() -> BlobStore:
+    return get_blob_store(BLOB_STORE_PATH, BLOB_MAX_BYTES, BLOB_MAX_AGE_DAYS)
+
+# ----------------------------
+# Conversation store (SQLite; sessions only keep a window of recent turns in memory)
+# ----------------------------
+@st.cache_resource
+def get_conversation_store(path: str) -> ConversationStore:
+    return ConversationStore(path)
+
+def load_history(entry: dict = None):
+    entry = entry or session_cache()
+    entry["messages"] = get_conversation_store(CHAT_DB_PATH).recent(
+        st.session_state.session_id, st.session_state.history_limit
+    )
+
+def append_message(role: str, content: str, raw=None, raw_ref: str = None, data=None):
+    messages = session_cache()["messages"]  # before the insert, so a reload can't pick the new row up twice
+    if raw is not None and raw_ref is None:
+        raw_ref = blob_store().put(raw)
+    msg = get_conversation_store(CHAT_DB_PATH).append(
+        st.session_state.session_id, st.session_state.user_id, role, content, raw_ref=raw_ref, data=data
+    )
+    messages.append(msg)
+    del messages[: -st.session_state.history_limit]
+
+# ----------------------------
+# Session registry (per-session caches live here, not in st.session_state, so idle ones can be released)
+# ----------------------------
+class SessionRegistry:
+    """Sessions by last-seen time; idle ones past `idle_ttl`, or the oldest beyond `max_sessions`, are dropped."""
+
+    ACTIVE_SECONDS = 300
+
+    def __init__(self, max_sessions: int, idle_ttl: float):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self._sessions = OrderedDict()  # session_id -> entry, least recently seen first
+        self._lock = threading.Lock()
+        self.evicted = 0
+
+    def touch(self, session_id: str, user_id: str) -> tuple:
+        """Return (entry, ids of sessions evicted to make room)."""
+        now = time.time()
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                entry = self._sessions[session_id] = {
+                    "user_id": user_id,
+                    "created_at": now,
+                    "last_seen": now,
+                    "messages": None,  # loaded window of recent turns
+                    "block_memo": OrderedDict(),  # message id -> render-ready pieces
+                }
+            entry["last_seen"] = now
+            entry["user_id"] = user_id
+            self._sessions.move_to_end(session_id)
+
+            evicted = []
+            while len(self._sessions) > 1:
+                oldest_id, oldest = next(iter(self._sessions.items()))
+                if now - oldest["last_seen"] < self.idle_ttl and len(self._sessions) <= self.max_sessions:
+                    break
+                del self._sessions[oldest_id]
+                evicted.append(oldest_id)
+            self.evicted += len(evicted)
+            return entry, evicted
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = list(self._sessions.values())
+            evicted = self.evicted
+        now = time.time()
+        size = 0
+        for entry in entries:
+            # rough: the text we hold on to, not Python object overhead
+            for msg in entry["messages"] or ():
+                size += len(msg["content"]) + (len(json.dumps(msg["data"])) if msg["data"] else 0)
+            for block in list(entry["block_memo"].values()):
+                size += len(block["content"]) + (sum(len(str(v)) for v in block["card"].values()) if block["card"] else 0)
+        return {
+            "tracked": len(entries),
+            "active": sum(now - e["last_seen"] < self.ACTIVE_SECONDS for e in entries),
+            "evicted": evicted,
+            "approx_bytes": size,
+        }
+
+@st.cache_resource
+def get_session_registry(max_sessions: int, idle_ttl: float) -> SessionRegistry:
+    return SessionRegistry(max_sessions, idle_ttl)
+
+def session_registry() -> SessionRegistry:
+    return get_session_registry(SESSION_MAX, SESSION_IDLE_TTL)
+
+def session_cache() -> dict:
+    """This session's registry entry (messages + block memo); rebuilt from the store after an eviction."""
+    entry, evicted = session_registry().touch(st.session_state.session_id, st.session_state.user_id)
+    for session_id in evicted:
+        get_conversation_store(CHAT_DB_PATH).index.drop(session_id)
+    if entry["messages"] is None:
+        load_history(entry)
+    return entry
 
 # ----------------------------
 # Session state
 # ----------------------------
+profile_section("session")
+if "browser_key" not in st.session_state:
+    # Random per-browser key in a cookie (set by the loader iframe below; read on the next connect)
+    cookie = st.context.cookies.get(BROWSER_COOKIE)
+    valid = isinstance(cookie, str) and SESSION_ID_PATTERN.fullmatch(cookie)
+    st.session_state.browser_key = cookie if valid else uuid.uuid4().hex
+
 if "session_id" not in st.session_state:
-    st.session_state.session_id = f"sess-{int(datetime.utcnow().timestamp())}"
+    # Kept in the URL so a reload picks the stored conversation back up; also n8n's memory key.
+    # Links get shared, so only the browser that started the session may resume it.
+    requested = st.query_params.get("session", "")
+    store = get_conversation_store(CHAT_DB_PATH)
+    if SESSION_ID_PATTERN.fullmatch(requested) and store.owner(requested) == st.session_state.browser_key:
+        st.session_state.session_id = requested
+    else:
+        st.session_state.session_id = f"sess-{uuid.uuid4().hex}"
+        store.claim(st.session_state.session_id, st.session_state.browser_key)
+    st.query_params["session"] = st.session_state.session_id
 
 if "user_id" not in st.session_state:
-    st.session_state.user_id = "aminul@hustadcompanies.com"
+    st.session_state.user_id = DEFAULT_USER_ID
+
+if "history_limit" not in st.session_state:
+    st.session_state.history_limit = HISTORY_PAGE_SIZE
 
-if "messages" not in st.session_state:
-    st.session_state.messages = []
+if "render_window" not in st.session_state:
+    st.session_state.render_window = CHAT_RENDER_WINDOW
 
 if "page" not in st.session_state:
     st.session_state.page = "Chat"
 
+if "stream_replies" not in st.session_state:
+    st.session_state.stream_replies = bool(st.secrets.get("N8N_STREAMING", True))
+
+if "jobs" not in st.session_state:
+    st.session_state.jobs = []  # in-flight BackendJobs, oldest first
+
+if "prefetched_at" not in st.session_state:
+    st.session_state.prefetched_at = None
+    st.session_state.last_turn_at = 0.0  # monotonic time of the last prompt sent
+
+if "show_debug" not in st.session_state:
+    st.session_state.show_debug = False
+    st.session_state.debug_paths = {}  # debug viewer key -> path into the payload
+    st.session_state.debug_bytes = 0  # preview bytes sent by the debug viewer in the current run
+
+if "rerun_counts" not in st.session_state:
+    st.session_state.rerun_counts = {"full": 0, "fragment": 0}
+    st.session_state.last_rerun = "full"
+
+if "fx_mode" not in st.session_state:
+    st.session_state.fx_mode = st.secrets.get("FX_MODE", "full")
+
+# Registers this session (or marks it seen) on every full run
+session_cache()
+
+# Call once (top-level)
+fx_preset = FX_PRESETS.get(st.session_state.fx_mode)
+components.html(
+    theme_and_overlay_html(fx_preset is not None, browser_key=st.session_state.browser_key, **(fx_preset or {})),
+    height=0,
+    width=0,
+)
+
 # ----------------------------
-# Helpers (FIX: normalize n8n shapes + prevent double output)
+# Record / replay (cassette of n8n exchanges, hooked in as the HTTP session's transport adapter)
 # ----------------------------
-def call_n8n(message: str) -> dict:
-    if not N8N_WEBHOOK_URL:
-        return {"message": "Missing N8N_WEBHOOK_URL in Streamlit secrets.", "data": {}, "raw": {}}
+profile_section("backend definitions")
+class Cassette:
+    """JSONL file of recorded webhook exchanges, looked up by (message, userId)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = {}  # (message, user_id) -> [entry, ...] in recording order
+        self._by_message = {}  # message -> [entry, ...], fallback when the user differs
+        self._replayed = {}  # key -> count, so repeated prompts walk through their recordings
+        self.recorded = 0
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        self._index(json.loads(line))
+
+    def _index(self, entry: dict):
+        message, user_id = entry["request"].get("message", ""), entry["request"].get("userId", "")
+        self._entries.setdefault((message, user_id), []).append(entry)
+        self._by_message.setdefault(message, []).append(entry)
+
+    def record(self, entry: dict):
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._index(entry)
+            self.recorded += 1
+
+    def has(self, message: str, user_id: str) -> bool:
+        with self._lock:
+            return bool(self._entries.get((message, user_id)) or self._by_message.get(message))
+
+    def find(self, message: str, user_id: str):
+        with self._lock:
+            key = (message, user_id)
+            entries = self._entries.get(key)
+            if not entries:
+                key = message
+                entries = self._by_message.get(message)
+            if not entries:
+                return None
+            n = self._replayed.get(key, 0)
+            self._replayed[key] = n + 1
+            return entries[n % len(entries)]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"exchanges": sum(map(len, self._entries.values())), "prompts": len(self._entries), "recorded": self.recorded}
+
+def _exchange_request(request) -> dict:
+    body = request.body or b"{}"
+    if request.headers.get("Content-Encoding") == "gzip":
+        body = gzip.decompress(body)
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        payload = {}
+    return {"message": payload.get("message", ""), "userId": payload.get("userId", "")}
+
+class _RecordingBody:
+    """Wraps urllib3's response body; passes chunks through and saves them once the body is read to the end."""
+
+    def __init__(self, raw, on_done, started: float):
+        self._raw = raw
+        self._on_done = on_done
+        self._started = started
+        self._decoder = codecs.getincrementaldecoder("utf-8")("replace")
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def stream(self, amt=2 ** 16, decode_content=None):
+        chunks = []
+        for chunk in self._raw.stream(amt, decode_content=decode_content):
+            chunks.append([round((time.perf_counter() - self._started) * 1000, 1), self._decoder.decode(chunk)])
+            yield chunk
+        chunks.append([round((time.perf_counter() - self._started) * 1000, 1), self._decoder.decode(b"", final=True)])
+        self._on_done([c for c in chunks if c[1]])
+
+class RecordingAdapter(HTTPAdapter):
+    def __init__(self, cassette: Cassette, **kwargs):
+        super().__init__(**kwargs)
+        self.cassette = cassette
+
+    def send(self, request, **kwargs):
+        started = time.perf_counter()
+        resp = super().send(request, **kwargs)
+        headers_ms = round((time.perf_counter() - started) * 1000, 1)
+        # The body is stored decoded, so only the content type is worth replaying
+        headers = {"Content-Type": resp.headers.get("Content-Type", "application/json")}
+
+        def save(chunks):
+            self.cassette.record({
+                "request": _exchange_request(request),
+                "status": resp.status_code,
+                "headers": headers,
+                "headers_ms": headers_ms,
+                "chunks": chunks,
+                "recorded_at": datetime.utcnow().isoformat(timespec="seconds"),
+            })
+
+        resp.raw = _RecordingBody(resp.raw, save, started)
+        return resp
+
+class _ReplayBody:
+    """File-like body for a replayed response; waits out the recorded chunk offsets times `scale`."""
+
+    def __init__(self, chunks: list, scale: float, started: float):
+        self._chunks = chunks
+        self._scale = scale
+        self._started = started
+        self._pos = 0
+
+    def stream(self, amt=2 ** 16, decode_content=None):
+        for offset_ms, text in self._chunks:
+            wait = self._started + offset_ms * self._scale / 1000 - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+            data = text.encode("utf-8")
+            self._pos += len(data)
+            yield data
+
+    def tell(self) -> int:
+        return self._pos
+
+    def close(self):
+        pass
+
+class ReplayMiss(Exception):
+    """A replayed prompt that was never recorded. Not an outage: the circuit breaker doesn't count it."""
+
+class ReplayAdapter(requests.adapters.BaseAdapter):
+    def __init__(self, cassette: Cassette, latency_scale: float):
+        super().__init__()
+        self.cassette = cassette
+        self.latency_scale = latency_scale
+
+    def send(self, request, **kwargs):
+        started = time.perf_counter()
+        req = _exchange_request(request)
+        entry = self.cassette.find(req["message"], req["userId"])
+        if entry is None:
+            raise requests.exceptions.ConnectionError(f"No recorded n8n reply for {req['message']!r} in the cassette.", request=request)
+        time.sleep(entry["headers_ms"] * self.latency_scale / 1000)
+
+        resp = requests.Response()
+        resp.status_code = entry["status"]
+        resp.reason = "Replayed"
+        resp.headers = CaseInsensitiveDict(entry["headers"])
+        resp.encoding = get_encoding_from_headers(resp.headers)
+        resp.raw = _ReplayBody(entry["chunks"], self.latency_scale, started)
+        resp.url = request.url
+        resp.request = request
+        resp.connection = self
+        return resp
+
+    def close(self):
+        pass
+
+@st.cache_resource
+def get_cassette(path: str) -> Cassette:
+    return Cassette(path)
 
-    payload = {
-        "message": message,
-        "sessionId": st.session_state.session_id,
-        "userId": st.session_state.user_id,
-    }
+# ----------------------------
+# HTTP client (one pooled keep-alive session per process, shared by all sessions)
+# ----------------------------
+# requests' default already lists every encoding urllib3 can decode (zstd needs backports.zstd before 3.14)
+ACCEPT_ENCODINGS = {"auto": requests.utils.DEFAULT_ACCEPT_ENCODING, "gzip": "gzip", "off": "identity"}
+
+@st.cache_resource
+def get_http_session(
+    pool_size: int, keep_alive: bool, mode: str, cassette_path: str, replay_scale: float, compression: str
+) -> requests.Session:
+    session = requests.Session()
+    if mode == "replay":
+        adapter = ReplayAdapter(get_cassette(cassette_path), replay_scale)
+    elif mode == "record":
+        adapter = RecordingAdapter(get_cassette(cassette_path), pool_connections=pool_size, pool_maxsize=pool_size)
+    else:
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    if not keep_alive:
+        session.headers["Connection"] = "close"
+    session.headers["Accept-Encoding"] = ACCEPT_ENCODINGS.get(compression, "identity")
+    return session
+
+def http_session() -> requests.Session:
+    return get_http_session(
+        N8N_POOL_SIZE, N8N_KEEP_ALIVE, N8N_BACKEND_MODE, N8N_CASSETTE_PATH, N8N_REPLAY_LATENCY_SCALE, N8N_COMPRESSION
+    )
+
+@st.cache_resource
+def get_plain_body_endpoints() -> set:
+    # Endpoints that turned a gzipped request body down; "auto" sends them plain bodies from then on
+    return set()
+
+def _post_body(url: str, body: bytes, gzipped: bytes, headers: dict, stream: bool) -> requests.Response:
+    """POST `gzipped` when there is one, else `body`; in "auto" mode a 415/400 to the gzipped body gets one plain resend."""
+    def post(data, extra_headers=None):
+        return http_session().post(
+            url,
+            data=data,
+            headers={**headers, **(extra_headers or {})},
+            stream=stream,
+            timeout=(N8N_CONNECT_TIMEOUT, N8N_READ_TIMEOUT),
+        )
+
+    plain_only = get_plain_body_endpoints()
+    if gzipped is None or url in plain_only:
+        return post(body)
+    r = post(gzipped, {"Content-Encoding": "gzip"})
+    if N8N_COMPRESSION != "auto" or r.status_code not in (400, 415):
+        return r
+    r.close()
+    r = post(body)
+    if r.status_code not in (400, 415):
+        # Only the encoding was the problem (a 400 for anything else comes back again)
+        plain_only.add(url)
+    return r
+
+# ----------------------------
+# Response cache (idempotent lookups only, keyed on normalized prompt + userId)
+# ----------------------------
+@st.cache_resource
+def get_response_cache(max_entries: int) -> ResponseCache:
+    return ResponseCache(max_entries)
+
+def cache_response(key, resp: dict, ttl: float):
+    # The raw payload goes to the blob store; the cache keeps only its reference
+    entry = {k: v for k, v in resp.items() if k != "raw"}
+    if resp.get("raw") is not None:
+        entry["raw_ref"] = blob_store().put(resp["raw"])
+    get_response_cache(CACHE_MAX_ENTRIES).put(key, entry, ttl)
+
+def cache_policy(message: str, user_id: str) -> tuple:
+    """Return (cache key, ttl); a ttl of 0 means the reply must come from n8n."""
+    intent = classify_prompt(message)
+    if intent == "mutation":
+        get_response_cache(CACHE_MAX_ENTRIES).bypass(user_id)
+    return (normalize_prompt(message), user_id), float(CACHE_TTLS.get(intent, 0))
+
+# ----------------------------
+# Single-flight (identical concurrent lookups share one in-flight n8n call)
+# ----------------------------
+@st.cache_resource
+def get_single_flight() -> SingleFlight:
+    return SingleFlight(gave_up=(NotAdmitted,))
+
+def flight_key(message: str, session_id: str, user_id: str):
+    intent = classify_prompt(message)
+    if intent == "mutation":
+        return None
+    # Free-form prompts lean on the session's n8n memory, so they are only shared within a session
+    if intent == "other":
+        return (normalize_prompt(message), user_id, session_id)
+    return (normalize_prompt(message), user_id)
+
+# ----------------------------
+# Resilience (circuit breaker + retries for lookups + hedged requests)
+# ----------------------------
+RETRY_STATUSES = {502, 503, 504}
+
+@st.cache_resource
+def get_backend_health(threshold: int, reset_seconds: float) -> BackendHealth:
+    return BackendHealth(threshold, reset_seconds)
+
+def backend_health() -> BackendHealth:
+    return get_backend_health(N8N_BREAKER_THRESHOLD, N8N_BREAKER_RESET_SECONDS)
+
+@st.cache_resource
+def get_hedge_pool(max_workers: int) -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="n8n-hedge")
+
+def is_idempotent(message: str) -> bool:
+    # Lookups only: free-form prompts feed the session's n8n memory, mutations change data
+    return classify_prompt(message) in dict(PROMPT_INTENTS)
 
-    r = requests.post(N8N_WEBHOOK_URL, json=payload, timeout=120)
-    r.raise_for_status()
+def hedge_delay(stage: str = "n8n_http"):
+    """Seconds to wait before a hedged second request: the recent p95 of `stage`, once there are enough samples."""
+    samples = sorted(metrics().samples(stage))
+    if len(samples) < N8N_HEDGE_MIN_SAMPLES:
+        return None
+    return samples[int(len(samples) * 0.95)] / 1000
 
+# ----------------------------
+# Endpoint routing (several n8n instances: fewest in flight × EWMA latency, probes eject dead ones)
+# ----------------------------
+@st.cache_resource
+def get_probing_routers() -> list:
+    return []
+
+@st.cache_resource
+def get_endpoint_router(
+    urls: tuple, eject_after: int, probe_interval: float, probe_timeout: float, health_path: str, sticky_max: int
+) -> EndpointRouter:
+    router = EndpointRouter(urls, eject_after, probe_interval, probe_timeout, health_path, sticky_max)
+    # Changed secrets build a new router; the one it replaces must stop probing
+    probing = get_probing_routers()
+    for old in probing:
+        old.stop()
+    probing[:] = [router]
+    return router
+
+def endpoint_router() -> EndpointRouter:
+    # Replay answers from the cassette whatever the URL, so there is nothing to probe
+    probe_interval = 0 if N8N_BACKEND_MODE == "replay" else N8N_HEALTH_INTERVAL
+    return get_endpoint_router(
+        N8N_WEBHOOK_URLS, N8N_EJECT_AFTER, probe_interval, N8N_CONNECT_TIMEOUT, N8N_HEALTH_PATH, SESSION_MAX
+    )
+
+# ----------------------------
+# Admission control (global cap on n8n executions, per-user token buckets, chat before Quick actions before prefetch)
+# ----------------------------
+@st.cache_resource
+def get_admission(max_in_flight: int, rate_per_minute: float, burst: int) -> Admission:
+    return Admission(max_in_flight, rate_per_minute, burst)
+
+def admission() -> Admission:
+    return get_admission(N8N_MAX_IN_FLIGHT, N8N_USER_RATE, N8N_USER_BURST)
+
+def rate_key() -> str:
+    """Whose token bucket this session spends: the user's, or the browser's while it is still DEFAULT_USER_ID."""
+    user_id = st.session_state.user_id
+    return st.session_state.browser_key if user_id == DEFAULT_USER_ID else user_id
+
+@contextmanager
+def admitted(ticket: Ticket):
+    gate = admission()
+    if not gate.acquire(ticket):
+        raise NotAdmitted("Backend call was cancelled or not admitted.")
     try:
-        resp = r.json()
-    except Exception:
-        return {"message": r.text, "data": {}, "raw": {"rawText": r.text}}
+        yield
+    finally:
+        gate.release()
+
+def _submit_hedge(pool: ThreadPoolExecutor, primary: Future, fn, *args) -> Future:
+    hedge = submit_hedge(admission(), pool, primary, fn, *args)
+    if hedge is not None:
+        backend_health().count("hedged")
+    return hedge
 
+# ----------------------------
+# Helpers (FIX: normalize n8n shapes + prevent double output)
+# ----------------------------
+def _post_n8n(message: str, session_id: str, user_id: str, stream: bool = False) -> requests.Response:
+    payload = {
+        "message": message,
+        "sessionId": session_id,
+        "userId": user_id,
+    }
+    body = json.dumps(payload).encode()
+    headers = {"Content-Type": "application/json"}
+    if stream:
+        headers["Accept"] = "application/x-ndjson, text/event-stream, application/json"
+    gzipped = gzip.compress(body, 6) if N8N_COMPRESSION != "off" and len(body) >= N8N_COMPRESS_MIN_BYTES else None
+
+    # Checked here, not in ReplayAdapter.send: _post_n8n would count its error as a backend failure
+    if N8N_BACKEND_MODE == "replay" and not get_cassette(N8N_CASSETTE_PATH).has(message, user_id):
+        raise ReplayMiss(f"No recorded n8n reply for {message!r} in the cassette.")
+
+    health = backend_health()
+    router = endpoint_router()
+    idempotent = is_idempotent(message)
+    affinity = None if idempotent else session_id
+    tried = []
+    attempts = 1 + N8N_RETRIES if idempotent else 1
+    for attempt in range(attempts):
+        if attempt:
+            # Full jitter, so sessions retrying the same outage don't line up
+            time.sleep(random.uniform(0, N8N_RETRY_BACKOFF * 2 ** (attempt - 1)))
+            health.count("retries")
+        retry_in = health.before_call()
+        if retry_in is not None:
+            raise BackendUnavailable(retry_in)
+        # Retries prefer an endpoint this call hasn't tried yet
+        url = router.acquire(affinity, exclude=tried)
+        tried.append(url)
+        started = time.perf_counter()
+        try:
+            r = _post_body(url, body, gzipped, headers, stream)
+        except requests.exceptions.ConnectionError:
+            # Includes ConnectTimeout. A ReadTimeout is not retried: n8n may still be running the workflow,
+            # and each retry would wait the full read timeout again
+            router.release(url, ok=False)
+            health.failure()
+            if attempt + 1 == attempts:
+                raise
+            continue
+        except Exception:
+            router.release(url, ok=False)
+            health.failure()
+            raise
+        # n8n's webhook answers once the workflow is done, so time to headers is the endpoint's latency
+        router.release(url, (time.perf_counter() - started) * 1000, ok=r.status_code not in RETRY_STATUSES)
+
+        if r.status_code not in RETRY_STATUSES:
+            # n8n answered (a 4xx/500 is the workflow's problem, not an outage)
+            health.success()
+            r.raise_for_status()
+            return r
+        health.failure()
+        if attempt + 1 == attempts:
+            r.raise_for_status()
+        r.close()
+
+def normalize_n8n_response(resp) -> dict:
     raw = resp
 
     # n8n often returns list: [{...}]
@@ -568,6 +1090,187 @@ def call_n8n(message: str) -> dict:
 
     return {"message": message_out or "—", "data": data_out or {}, "raw": raw}
 
+def parse_n8n_body(text: str) -> dict:
+    try:
+        with metrics().timer("json_decode"):
+            resp = json.loads(text)
+    except Exception:
+        # A streaming workflow answered a non-streaming request: stitch its items together
+        events = list(iter_ndjson(text.splitlines()))
+        if events and is_stream_event(events[0]):
+            data_out = next((e["data"] for e in reversed(events) if isinstance(e, dict) and isinstance(e.get("data"), dict)), {})
+            return {"message": "".join(map(chunk_text, events)) or "—", "data": data_out, "raw": {"stream": events}}
+        return {"message": text, "data": {}, "raw": {"rawText": text}}
+    with metrics().timer("normalize"):
+        return normalize_n8n_response(resp)
+
+def _fetch_body(message: str, session_id: str, user_id: str) -> str:
+    with metrics().timer("n8n_http") as sizes:
+        r = _post_n8n(message, session_id, user_id)
+        body = r.text
+        sizes["sent"] = len(r.request.body or b"")
+        # bytes on the wire; the body itself has already been decompressed by urllib3
+        sizes["received"] = r.raw.tell() or len(r.content)
+    return body
+
+def _fetch_n8n(message: str, session_id: str, user_id: str) -> dict:
+    delay = hedge_delay() if N8N_HEDGE and is_idempotent(message) else None
+    if delay is None:
+        return parse_n8n_body(_fetch_body(message, session_id, user_id))
+
+    # Hedged: if the first request is slower than the recent p95, race a second one.
+    # The loser runs to completion in the background (still holding an admission slot) and its
+    # connection goes back to the pool.
+    pool = get_hedge_pool(N8N_WORKERS * 2)
+    primary = pool.submit(_fetch_body, message, session_id, user_id)
+    if wait([primary], timeout=delay).done:
+        return parse_n8n_body(primary.result())
+
+    hedge = _submit_hedge(pool, primary, _fetch_body, message, session_id, user_id)
+    if hedge is None:
+        return parse_n8n_body(primary.result())
+    winner = first_success(primary, hedge)
+    if winner is hedge:
+        backend_health().count("hedge_wins")
+    return parse_n8n_body(winner.result())  # both failed: raises the primary's error
+
+def call_n8n(message: str, session_id: str, user_id: str, ticket: Ticket = None) -> dict:
+    if not N8N_WEBHOOK_URL:
+        return {"message": "Missing N8N_WEBHOOK_URL in Streamlit secrets.", "data": {}, "raw": {}}
+
+    key, ttl = cache_policy(message, user_id)
+    cached = get_response_cache(CACHE_MAX_ENTRIES).get(key) if ttl else None
+    if cached:
+        prefetcher().claim(key)
+        return cached
+
+    # Only calls that reach n8n go through admission: cache hits and single-flight followers don't queue
+    ticket = ticket or Ticket(user_id)
+
+    def fetch():
+        with admitted(ticket):
+            return _fetch_n8n(message, session_id, user_id)
+
+    flight = flight_key(message, session_id, user_id)
+    resp = get_single_flight().do(flight, fetch) if flight else fetch()
+    if ttl:
+        cache_response(key, resp, ttl)
+    return resp
+
+# ----------------------------
+# Streaming (n8n "streaming" responses: NDJSON items or SSE; anything else falls back to call_n8n's path)
+# ----------------------------
+def stream_n8n(message: str, session_id: str, user_id: str, result: dict, ticket: Ticket = None):
+    """Yield reply text as it arrives; `result` is filled with the normalized response when done."""
+    if not N8N_WEBHOOK_URL:
+        result.update(call_n8n(message, session_id, user_id, ticket))
+        yield result["message"]
+        return
+
+    key, ttl = cache_policy(message, user_id)
+    cached = get_response_cache(CACHE_MAX_ENTRIES).get(key) if ttl else None
+    if cached:
+        prefetcher().claim(key)
+        result.update(cached)
+        yield result["message"]
+        return
+
+    flight = flight_key(message, session_id, user_id)
+    while flight:
+        future, leader = get_single_flight().join(flight)
+        if leader:
+            break
+        shared = get_single_flight().follow(future)
+        if shared is not None:
+            result.update(shared)
+            yield result["message"]
+            return
+
+    try:
+        with admitted(ticket or Ticket(user_id)):
+            yield from _stream_n8n(message, session_id, user_id, result)
+    except BaseException as e:
+        if flight:
+            get_single_flight().finish(flight, error=e)
+        raise
+    if flight:
+        get_single_flight().finish(flight, result)
+    if ttl:
+        cache_response(key, result, ttl)
+
+def _close_response(future: Future):
+    if future.exception() is None:
+        future.result().close()
+
+def _open_stream(message: str, session_id: str, user_id: str) -> requests.Response:
+    """POST for a streamed reply, hedged like _fetch_n8n until the response headers (first byte) arrive."""
+    with metrics().timer("n8n_ttfb"):
+        delay = hedge_delay("n8n_ttfb") if N8N_HEDGE and is_idempotent(message) else None
+        if delay is None:
+            return _post_n8n(message, session_id, user_id, stream=True)
+
+        pool = get_hedge_pool(N8N_WORKERS * 2)
+        primary = pool.submit(_post_n8n, message, session_id, user_id, True)
+        if wait([primary], timeout=delay).done:
+            return primary.result()
+
+        hedge = _submit_hedge(pool, primary, _post_n8n, message, session_id, user_id, True)
+        if hedge is None:
+            return primary.result()
+        winner = first_success(primary, hedge)
+        if winner is hedge:
+            backend_health().count("hedge_wins")
+        # Nobody reads the loser's body: close it (now, or once its headers arrive)
+        (primary if winner is hedge else hedge).add_done_callback(_close_response)
+        return winner.result()  # both failed: raises the primary's error
+
+def _stream_n8n(message: str, session_id: str, user_id: str, result: dict):
+    # Timed from the request until the last chunk, including time spent by the consumer
+    with metrics().timer("n8n_stream") as sizes, _open_stream(message, session_id, user_id) as r:
+        sizes["sent"] = len(r.request.body or b"")
+        content_type = r.headers.get("Content-Type", "").split(";")[0].strip().lower()
+
+        if content_type == "text/event-stream":
+            # SSE is always UTF-8; without a charset requests would decode it as ISO-8859-1
+            r.encoding = "utf-8"
+            events = iter_sse(r)
+        else:
+            r.encoding = r.encoding or "utf-8"
+            lines = iter_text_lines(r)
+            first = next((line for line in lines if line and line.strip()), "")
+            try:
+                first_event = json.loads(first)
+            except ValueError:
+                first_event = None
+
+            # n8n streams application/json as one {"type": ...} object per line; a plain
+            # JSON body (possibly pretty-printed) has no such first line.
+            if content_type in NDJSON_TYPES or is_stream_event(first_event):
+                events = iter_ndjson(itertools.chain([first], lines))
+            else:
+                body = "\n".join(itertools.chain([first], lines))
+                sizes["received"] = r.raw.tell()
+                result.update(parse_n8n_body(body))
+                yield result["message"]
+                return
+
+        parts = []
+        raw_events = []
+        data_out = {}
+        for event in events:
+            raw_events.append(event)
+            if isinstance(event, dict) and event.get("type") == "error":
+                raise RuntimeError(event.get("content") or event.get("message") or "Stream error from backend.")
+            if isinstance(event, dict) and isinstance(event.get("data"), dict):
+                data_out = event["data"]
+            text = chunk_text(event)
+            if text:
+                parts.append(text)
+                yield text
+        sizes["received"] = r.raw.tell()
+
+    result.update({"message": "".join(parts) or "—", "data": data_out, "raw": {"stream": raw_events}})
+
 def looks_like_property(data: dict) -> bool:
     if not isinstance(data, dict):
         return False
@@ -576,7 +1279,7 @@ def looks_like_property(data: dict) -> bool:
         return "name" in attrs or "streetAddress" in attrs
     return any(k in data for k in ["Property name", "roofType", "numberOfBuildings", "attributes"])
 
-def render_property_card(data: dict):
+def property_card_view(data: dict) -> dict:
     attrs = {}
     link = None
 
@@ -607,9 +1310,8 @@ def render_property_card(data: dict):
             addr_parts.append(tail)
         address = " • ".join(addr_parts)
 
-    st.markdown('<div class="card" style="padding:1rem;">', unsafe_allow_html=True)
-    st.markdown(
-        f"""
+    return {
+        "header": f"""
         <div style="display:flex; align-items:flex-start; justify-content:space-between; gap:1rem;">
           <div>
             <div style="font-size:1.15rem; font-weight:800;">{name or "Property"}</div>
@@ -618,47 +1320,642 @@ def render_property_card(data: dict):
           <div class="chip">🏢 Property</div>
         </div>
         """,
-        unsafe_allow_html=True,
-    )
+        "metrics": [
+            ("Buildings", buildings if buildings is not None else "—"),
+            ("Squares", squares if squares is not None else "—"),
+            ("Close Rate", f"{close_rate}%" if close_rate is not None else "—"),
+            ("Roof", roof if roof else "—"),
+        ],
+        "activity": f"""
+        <div class="tiny">
+          <b>Activity:</b> {activity or "—"}
+        </div>
+        """,
+        "link": link,
+    }
+
+def render_property_card(data: dict = None, view: dict = None):
+    with metrics().timer("property_card"):
+        _render_property_card(view or property_card_view(data))
+
+def _render_property_card(view: dict):
+    st.markdown('<div class="card" style="padding:1rem;">', unsafe_allow_html=True)
+    st.markdown(view["header"], unsafe_allow_html=True)
 
     st.markdown('<div class="divider"></div>', unsafe_allow_html=True)
 
-    c1, c2, c3, c4 = st.columns(4)
-    c1.metric("Buildings", buildings if buildings is not None else "—")
-    c2.metric("Squares", squares if squares is not None else "—")
-    c3.metric("Close Rate", f"{close_rate}%" if close_rate is not None else "—")
-    c4.metric("Roof", roof if roof else "—")
+    for col, (label, value) in zip(st.columns(4), view["metrics"]):
+        col.metric(label, value)
 
     st.markdown('<div class="divider"></div>', unsafe_allow_html=True)
-    st.markdown(
-        f"""
-        <div class="tiny">
-          <b>Activity:</b> {activity or "—"}
-        </div>
-        """,
-        unsafe_allow_html=True,
+    st.markdown(view["activity"], unsafe_allow_html=True)
+
+    if view["link"]:
+        st.markdown(f"🔗 For more info: {view['link']}")
+
+    st.markdown("</div>", unsafe_allow_html=True)
+
+# ----------------------------
+# Tabular results (list-shaped `data` -> columnar DataFrame; filter/sort/paging happen server-side)
+# ----------------------------
+def tabular_rows(data):
+    """Return (name, rows) when `data` is, or holds, a list of records; else None."""
+    if isinstance(data, list):
+        name, rows = "results", data
+    elif isinstance(data, dict):
+        lists = [(k, v) for k, v in data.items() if isinstance(v, list) and v]
+        if not lists:
+            return None
+        name, rows = max(lists, key=lambda kv: len(kv[1]))
+    else:
+        return None
+    if len(rows) < TABLE_MIN_ROWS or not all(isinstance(row, dict) for row in rows):
+        return None
+    return name, rows
+
+def table_message_data(data) -> dict:
+    # Rows go to the blob store (compressed, deduplicated); the message only keeps a reference
+    name, rows = tabular_rows(data)
+    return {"table": {"name": name, "ref": blob_store().put(rows), "rows": len(rows)}}
+
+def _table_cell(value):
+    if value is None or isinstance(value, str):
+        return value
+    return json.dumps(value) if isinstance(value, (list, dict)) else str(value)
+
+@st.cache_resource(max_entries=TABLE_CACHE_ENTRIES)
+def load_table(ref: str):
+    """(DataFrame, lowercase row text for filtering) for a stored result set, or None if it expired."""
+    # pandas takes ~0.5s to import: only pay for it once a table is actually shown
+    import pandas as pd
+
+    rows = blob_store().get(ref)
+    if rows is None:
+        return None
+    df = pd.json_normalize(rows)
+    for col in df.columns:
+        if df[col].dtype == object:
+            # nested lists / mixed scalars: one string type per column keeps it columnar
+            df[col] = df[col].map(_table_cell)
+    haystack = df.astype(str).agg(" ".join, axis=1).str.lower()
+    return df, haystack
+
+@st.cache_resource(max_entries=TABLE_CACHE_ENTRIES)
+def table_view(ref: str, query: str, sort_by: str, descending: bool):
+    df, haystack = load_table(ref)
+    if query:
+        df = df[haystack.str.contains(query.lower(), regex=False).to_numpy()]
+    if sort_by:
+        df = df.sort_values(sort_by, ascending=not descending, kind="stable", na_position="last")
+    return df
+
+def render_table(table: dict, key: str):
+    if load_table(table["ref"]) is None:
+        st.caption(f"{table['rows']} {table['name']} (no longer available, retention policy).")
+        return
+    df, _ = load_table(table["ref"])
+
+    c1, c2, c3 = st.columns([3, 2, 1])
+    query = c1.text_input("Filter", key=f"{key}_q", placeholder=f"Filter {table['name']}…", label_visibility="collapsed")
+    sort_by = c2.selectbox("Sort by", ["(original order)", *df.columns], key=f"{key}_sort", label_visibility="collapsed")
+    descending = c3.toggle("Desc", key=f"{key}_desc")
+    view = table_view(table["ref"], query.strip(), None if sort_by == "(original order)" else sort_by, descending)
+
+    pages = max((len(view) + TABLE_PAGE_SIZE - 1) // TABLE_PAGE_SIZE, 1)
+    page = st.number_input("Page", 1, pages, 1, key=f"{key}_page") if pages > 1 else 1
+    page = min(page, pages)
+    st.dataframe(view.iloc[(page - 1) * TABLE_PAGE_SIZE:page * TABLE_PAGE_SIZE], hide_index=True)
+    st.caption(f"{len(view)} of {len(df)} {table['name']} • page {page} of {pages}")
+
+# ----------------------------
+# Rerun accounting (full script runs vs fragment-only reruns)
+# ----------------------------
+profile_section("ui definitions")
+def in_fragment_rerun() -> bool:
+    ctx = get_script_run_ctx()
+    return bool(ctx and ctx.fragment_ids_this_run)
+
+def rerun_fragment():
+    # Widgets inside a fragment normally trigger a fragment rerun; fall back to a full
+    # rerun when the click was handled during a full run
+    st.rerun(scope="fragment" if in_fragment_rerun() else "app")
+
+def count_rerun(scope: str):
+    # Called once per full run from the top level, and by each fragment; fragments only
+    # count when they rerun on their own
+    fragment_run = in_fragment_rerun()
+    if scope == "app" and not fragment_run:
+        st.session_state.rerun_counts["full"] += 1
+        st.session_state.last_rerun = "full"
+    elif scope != "app" and fragment_run:
+        st.session_state.rerun_counts["fragment"] += 1
+        st.session_state.last_rerun = scope
+
+count_rerun("app")
+
+# ----------------------------
+# Chat history rendering (only the last turns are drawn; blocks are memoized by message id)
+# ----------------------------
+def message_block(msg: dict, memo: OrderedDict) -> dict:
+    # Stored messages never change, so their render-ready pieces are built once per session
+    block = memo.get(msg["id"])
+    if block is None:
+        block = {
+            "role": msg["role"],
+            "content": msg["content"],
+            "card": property_card_view(msg["data"]) if msg.get("data") and "table" not in msg["data"] else None,
+            "table": (msg.get("data") or {}).get("table"),
+        }
+        memo[msg["id"]] = block
+        while len(memo) > HISTORY_MAX_LOADED:
+            memo.popitem(last=False)
+    return block
+
+@st.cache_resource(max_entries=8)
+def load_payload(raw_ref: str):
+    return blob_store().get(raw_ref)
+
+def _json_path(path: tuple) -> str:
+    return "$" + "".join(f"[{p}]" if isinstance(p, int) else f".{p}" for p in path)
+
+@st.cache_resource(max_entries=64)
+def payload_preview(raw_ref: str, path: tuple) -> tuple:
+    """(preview of one level of the node at `path`, its nested children) - what the viewer ships."""
+    node = load_payload(raw_ref)
+    for part in path:
+        node = node[part]
+
+    def hint(value):
+        if isinstance(value, (dict, list)):
+            size = len(json.dumps(value, default=str))
+            kind = f"{{…}} {len(value)} keys" if isinstance(value, dict) else f"[…] {len(value)} items"
+            return f"{kind}, {size / 1024:.1f} KB"
+        if isinstance(value, str) and len(value) > DEBUG_PREVIEW_CHARS:
+            return value[:DEBUG_PREVIEW_CHARS] + f"… (+{len(value) - DEBUG_PREVIEW_CHARS} chars)"
+        return value
+
+    if isinstance(node, dict):
+        preview = {k: hint(v) for k, v in itertools.islice(node.items(), DEBUG_PREVIEW_ITEMS)}
+        if len(node) > DEBUG_PREVIEW_ITEMS:
+            preview["…"] = f"{len(node) - DEBUG_PREVIEW_ITEMS} more keys"
+        children = [k for k, v in node.items() if isinstance(v, (dict, list))]
+    elif isinstance(node, list):
+        preview = [hint(v) for v in node[:DEBUG_PREVIEW_ITEMS]]
+        if len(node) > DEBUG_PREVIEW_ITEMS:
+            preview.append(f"… {len(node) - DEBUG_PREVIEW_ITEMS} more items")
+        children = [i for i, v in enumerate(node) if isinstance(v, (dict, list))]
+    else:
+        preview, children = hint(node), []
+    return preview, children
+
+def _open_child(key: str):
+    st.session_state.debug_paths.setdefault(key, []).append(st.session_state[f"{key}_open"])
+    st.session_state[f"{key}_open"] = None
+
+def _close_child(key: str):
+    st.session_state.debug_paths[key].pop()
+
+def render_raw_payload(raw_ref: str, key: str):
+    info = blob_store().info(raw_ref)
+    if info is None:
+        st.caption("Payload no longer available (retention policy).")
+        return
+    st.caption(f"sha256 {raw_ref[:12]}… • {info['size'] / 1024:.1f} KB ({info['stored_size'] / 1024:.1f} KB stored)")
+    # Only decompress once someone actually asks for it
+    if not st.toggle("Load payload", key=key):
+        return
+
+    # One level at a time: scalars (long strings cut) plus size hints for nested values
+    path = tuple(st.session_state.debug_paths.get(key, ()))
+    preview, children = payload_preview(raw_ref, path)
+    size = len(json.dumps(preview, default=str))
+    if st.session_state.debug_bytes + size > DEBUG_BYTES_PER_RERUN:
+        st.caption(
+            f"Skipped: debug views on this page already sent {st.session_state.debug_bytes / 1024:.1f} KB this rerun "
+            f"(budget {DEBUG_BYTES_PER_RERUN / 1024:.1f} KB). Close another payload to see this one."
+        )
+        return
+    st.session_state.debug_bytes += size
+
+    c1, c2 = st.columns([3, 1])
+    c1.caption(f"`{_json_path(path)}`")
+    if path:
+        c2.button("⬆ Up", key=f"{key}_up", on_click=_close_child, args=(key,))
+    st.json(preview)
+    if children:
+        st.selectbox(
+            "Open",
+            children,
+            index=None,
+            key=f"{key}_open",
+            placeholder="Open a nested value…",
+            format_func=lambda child: _json_path(path + (child,)),
+            on_change=_open_child,
+            args=(key,),
+            label_visibility="collapsed",
+        )
+
+def render_history(show_debug: bool, total_messages: int):
+    entry = session_cache()
+    messages = entry["messages"]
+    window = messages[-st.session_state.render_window:]
+
+    hidden = total_messages - len(window)
+    can_load = len(window) < len(messages) or st.session_state.history_limit < HISTORY_MAX_LOADED
+    if hidden > 0 and can_load and st.button(f"⬆️ Load earlier messages ({hidden} more)"):
+        st.session_state.render_window += CHAT_RENDER_WINDOW
+        if st.session_state.render_window > len(messages):
+            st.session_state.history_limit = min(
+                max(st.session_state.history_limit, st.session_state.render_window), HISTORY_MAX_LOADED
+            )
+            load_history()
+        rerun_fragment()
+
+    for msg in window:
+        block = message_block(msg, entry["block_memo"])
+        with st.chat_message(block["role"]):
+            st.markdown(block["content"])
+            if block["card"]:
+                render_property_card(view=block["card"])
+            if block["table"]:
+                render_table(block["table"], key=f"table_{msg['id']}")
+            if show_debug and msg.get("raw_ref") and block["role"] == "assistant":
+                with st.expander("Debug / Raw response", expanded=False):
+                    render_raw_payload(msg["raw_ref"], key=f"raw_{msg['id']}")
+
+# ----------------------------
+# Background jobs (backend calls run on a bounded shared pool; the session keeps a handle)
+# ----------------------------
+@st.cache_resource
+def get_backend_pool(max_workers: int) -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="n8n")
+
+def backend_pool() -> ThreadPoolExecutor:
+    # Admission caps the n8n calls; the extra threads let queued jobs wait in its priority order, not the pool's FIFO
+    return get_backend_pool(N8N_WORKERS + N8N_QUEUE_SIZE)
+
+@st.cache_resource
+def get_job_slots(slots: int) -> threading.BoundedSemaphore:
+    return threading.BoundedSemaphore(slots)
+
+def submit_backend_job(fn, *args) -> Future:
+    """Run `fn` on the backend pool, or return None when N8N_QUEUE_SIZE jobs are already waiting.
+
+    One slot per pool thread, so a job is never left in the executor's own queue, where it would
+    wait unseen and out of priority order.
+    """
+    slots = get_job_slots(N8N_WORKERS + N8N_QUEUE_SIZE)
+    if not slots.acquire(blocking=False):
+        return None
+    future = backend_pool().submit(fn, *args)
+    future.add_done_callback(lambda _: slots.release())
+    return future
+
+class BackendJob:
+    def __init__(self, prompt: str, ticket: Ticket, gate: threading.Semaphore = None):
+        self.prompt = prompt
+        self.ticket = ticket
+        self.gate = gate  # shared by the jobs of one batch to cap its concurrency
+        self.started_at = time.monotonic()
+        self.text = ""
+        self.result = None
+        self.error = None
+        self.future = None
+        self._cancelled = threading.Event()
+
+    def run(self, session_id: str, user_id: str, stream: bool):
+        # Runs on a pool thread: no st.* calls in here
+        with self.gate or nullcontext():
+            if not self._cancelled.is_set():
+                self._run(session_id, user_id, stream)
+
+    def _run(self, session_id: str, user_id: str, stream: bool):
+        try:
+            if stream:
+                result = {}
+                chunks = stream_n8n(self.prompt, session_id, user_id, result, self.ticket)
+                try:
+                    for chunk in chunks:
+                        if self._cancelled.is_set():
+                            return
+                        self.text += chunk
+                finally:
+                    chunks.close()
+                self.result = result
+            else:
+                self.result = call_n8n(self.prompt, session_id, user_id, self.ticket)
+        except Exception as e:
+            self.error = e
+
+    def done(self) -> bool:
+        return self.future.done()
+
+    def cancel(self):
+        self._cancelled.set()
+        self.ticket.cancelled.set()
+        self.future.cancel()
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    def response(self) -> dict:
+        if isinstance(self.error, BackendUnavailable):
+            return {"message": "n8n is unavailable right now, please try again shortly.", "data": {}, "raw": {"error": str(self.error)}}
+        if isinstance(self.error, requests.exceptions.HTTPError):
+            return {"message": "HTTP error calling backend.", "data": {}, "raw": {"error": str(self.error)}}
+        if self.error is not None:
+            return {"message": "Unexpected error calling backend.", "data": {}, "raw": {"error": str(self.error)}}
+        return self.result or {}
+
+def _start_job(prompt: str, priority: str = "chat", gate: threading.Semaphore = None):
+    st.session_state.last_turn_at = time.monotonic()
+    job = BackendJob(prompt, Ticket(rate_key(), priority), gate)
+    job.future = submit_backend_job(
+        job.run,
+        st.session_state.session_id,
+        st.session_state.user_id,
+        st.session_state.stream_replies,
     )
+    if job.future is None:
+        # Queue is full: the job lands on the next poll with this reply instead of waiting
+        job.result = {"message": "n8n is busy right now, please try again shortly.", "data": {}, "raw": {}}
+        job.future = Future()
+        job.future.set_result(None)
+    st.session_state.jobs.append(job)
+
+def submit_prompt(prompt: str, priority: str = "chat"):
+    append_message("user", prompt)
+    _start_job(prompt, priority)
+
+def submit_batch(label: str, prompts: list):
+    """Send several prompts at once; replies land in the chat as each one completes."""
+    append_message("user", f"{label}\n\n" + "\n".join(f"- {p}" for p in prompts))
+    gate = threading.Semaphore(N8N_BATCH_CONCURRENCY)
+    for prompt in prompts:
+        _start_job(prompt, "quick", gate)
+
+def cancel_jobs():
+    for job in st.session_state.jobs:
+        job.cancel()
+    st.session_state.jobs = []
+
+def collect_finished_jobs():
+    finished = [job for job in st.session_state.jobs if job.done()]
+    if not finished:
+        return
+    st.session_state.jobs = [job for job in st.session_state.jobs if job not in finished]
+
+    for job in finished:
+        metrics().record("turn", job.elapsed() * 1000)
+        resp = job.response()
+        if job.error is not None:
+            st.toast(f"Request failed: {job.error}", icon="⚠️")
+
+        data = resp.get("data") or {}
+        append_message(
+            "assistant",
+            resp.get("message", "") or "—",
+            raw=resp.get("raw"),
+            raw_ref=resp.get("raw_ref"),
+            data=data if looks_like_property(data) else table_message_data(data) if tabular_rows(data) else None,
+        )
+
+def render_pending(jobs: list) -> bool:
+    """One bubble per pending job plus Cancel; True once cancelled (the chat then needs redrawing)."""
+    for job in jobs:
+        with st.chat_message("assistant"):
+            suffix = f" • {job.prompt}" if len(jobs) > 1 else ""
+            if job.text:
+                st.markdown(job.text + " ▌")
+            elif job.ticket.ready_in:
+                st.caption(f"Rate limited, starting in ~{job.ticket.ready_in:.0f}s" + suffix)
+            elif job.ticket.position:
+                st.caption(f"Queued • #{job.ticket.position} in line • {job.elapsed():.0f}s" + suffix)
+            else:
+                st.caption(f"Working… {job.elapsed():.0f}s" + suffix)
+    if st.button("✖ Cancel", key="cancel_job"):
+        cancel_jobs()
+        append_message("assistant", "Cancelled.")
+        return True
+    return False
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def render_pending_jobs():
+    # Only used when a full run drew the chat pane (page load, Quick actions): a scope="fragment"
+    # rerun isn't allowed there, so a landed reply still takes one full rerun
+    count_rerun("job poll")
+    jobs = st.session_state.jobs
+    if not jobs or any(job.done() for job in jobs) or render_pending(jobs):
+        st.rerun()
 
-    if link:
-        st.markdown(f"🔗 For more info: {link}")
+# Quick actions: (label, prompt); a tuple of prompts is sent as one batch
+QUICK_ACTIONS = [
+    ("📊 Dashboard", ("show company Riverport Landings Senior", "show tickets")),
+    ("🏢 Find a property", "show company Riverport Landings Senior"),
+    ("🎟️ Check tickets", "show tickets"),
+    ("📝 Create service ticket", "create service ticket for Riverport Landings Senior"),
+]
+
+@st.fragment
+def chat_pane():
+    # Typing a message, paging history and debug toggles rerun only this fragment. During those
+    # reruns the pane also polls its own jobs, so a reply lands without rerunning the page.
+    count_rerun("chat")
+    live = in_fragment_rerun()
+    if live:
+        collect_finished_jobs()
+    st.session_state.debug_bytes = 0
+    jobs = st.session_state.jobs
+    total_messages = get_conversation_store(CHAT_DB_PATH).count(st.session_state.session_id)
+
+    render_history(st.session_state.show_debug, total_messages)
+
+    if jobs and not live:
+        render_pending_jobs()
+    elif jobs and render_pending(jobs):
+        st.rerun(scope="fragment")
+
+    prompt = st.chat_input("Type your message…", disabled=bool(jobs))
+    if prompt and not jobs:
+        submit_prompt(prompt)
+        rerun_fragment()
+
+    if live and jobs:
+        # Redraw every JOB_POLL_SECONDS for progress, or as soon as a reply is in
+        wait([job.future for job in jobs], timeout=JOB_POLL_SECONDS, return_when=FIRST_COMPLETED)
+        st.rerun(scope="fragment")
+
+@st.fragment(run_every=PANEL_REFRESH_SECONDS)
+def overview_card():
+    # Polls: replies land through chat-pane-only reruns, so the message count and busy state change under it
+    count_rerun("overview")
+    busy = bool(st.session_state.jobs)
+
+    st.markdown('<div class="card" style="padding:1rem;">', unsafe_allow_html=True)
+    st.markdown("#### Overview")
+    st.caption("Quick glance at your assistant usage")
+    st.metric("Messages", get_conversation_store(CHAT_DB_PATH).count(st.session_state.session_id))
+    st.metric("Session", st.session_state.session_id)
+    st.markdown('<div class="divider"></div>', unsafe_allow_html=True)
+
+    st.markdown("#### Quick actions")
+    for label, quick_prompt in QUICK_ACTIONS:
+        if st.button(label, disabled=busy):
+            if isinstance(quick_prompt, tuple):
+                submit_batch(label, quick_prompt)
+            else:
+                submit_prompt(quick_prompt, "quick")
+            # the reply shows up in the chat pane, which is a different fragment
+            st.rerun()
 
     st.markdown("</div>", unsafe_allow_html=True)
 
+# ----------------------------
+# Speculative prefetch (warms the response cache with Quick action lookups while the session is idle)
+# ----------------------------
+class Prefetcher:
+    """Per-user prefetch budget plus hit/wasted accounting for prefetched cache entries."""
+
+    def __init__(self, budget_per_hour: int):
+        self.budget = budget_per_hour
+        self._lock = threading.Lock()
+        self._spent = {}  # user_id -> deque of prefetch times in the last hour
+        self._pending = {}  # cache key -> expiry of a prefetched entry nobody has read yet
+        self.issued = 0
+        self.hits = 0
+        self.wasted = 0
+        self.over_budget = 0
+
+    def _sweep(self, now: float):
+        for key, expires_at in list(self._pending.items()):
+            if expires_at <= now:
+                del self._pending[key]
+                self.wasted += 1
+
+    def reserve(self, key, user_id: str, ttl: float) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            self._sweep(now)
+            if key in self._pending:
+                return False
+            spent = self._spent.setdefault(user_id, deque())
+            while spent and spent[0] < now - 3600:
+                spent.popleft()
+            if len(spent) >= self.budget:
+                self.over_budget += 1
+                return False
+            spent.append(now)
+            self._pending[key] = now + ttl
+            self.issued += 1
+            return True
+
+    def forget(self, key):
+        # The prefetch never ran (admission turned it away): neither a hit nor wasted
+        with self._lock:
+            self._pending.pop(key, None)
+
+    def claim(self, key):
+        # Called on every cache hit; only the first read of a prefetched entry counts
+        with self._lock:
+            expires_at = self._pending.pop(key, None)
+            if expires_at is None:
+                return
+            if expires_at > time.monotonic():
+                self.hits += 1
+            else:
+                self.wasted += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._sweep(time.monotonic())
+            used = self.hits + self.wasted
+            return {
+                "issued": self.issued,
+                "hits": self.hits,
+                "wasted": self.wasted,
+                "pending": len(self._pending),
+                "over_budget": self.over_budget,
+                "hit_rate": self.hits / used if used else 0.0,
+            }
+
+@st.cache_resource
+def get_prefetcher(budget_per_hour: int) -> Prefetcher:
+    return Prefetcher(budget_per_hour)
+
+def prefetcher() -> Prefetcher:
+    return get_prefetcher(N8N_PREFETCH_BUDGET)
+
+def prefetch_candidates() -> list:
+    prompts = []
+    for _, quick_prompt in QUICK_ACTIONS:
+        prompts += quick_prompt if isinstance(quick_prompt, tuple) else [quick_prompt]
+    # Cacheable lookups only: mutations never run speculatively
+    return [p for p in dict.fromkeys(prompts) if classify_prompt(p) != "mutation" and CACHE_TTLS.get(classify_prompt(p))]
+
+def _prefetch(prompt: str, key, user_id: str, ticket: Ticket):
+    # Own n8n session, so the speculative prompt doesn't show up in the user's chat memory
+    try:
+        call_n8n(prompt, f"prefetch-{user_id}", user_id, ticket)
+    except NotAdmitted:
+        prefetcher().forget(key)
+
+def maybe_prefetch():
+    """On session start, then whenever the session has sat idle for N8N_PREFETCH_IDLE_SECONDS."""
+    if not N8N_PREFETCH or not N8N_WEBHOOK_URL or st.session_state.jobs:
+        return
+    now = time.monotonic()
+    if st.session_state.prefetched_at is not None and (
+        now - st.session_state.prefetched_at < N8N_PREFETCH_IDLE_SECONDS
+        or now - st.session_state.last_turn_at < N8N_PREFETCH_IDLE_SECONDS
+    ):
+        return
+    st.session_state.prefetched_at = now
+
+    user_id = st.session_state.user_id
+    for prompt in prefetch_candidates():
+        key, ttl = cache_policy(prompt, user_id)
+        if get_response_cache(CACHE_MAX_ENTRIES).contains(key) or not prefetcher().reserve(key, user_id, ttl):
+            continue
+        if submit_backend_job(_prefetch, prompt, key, user_id, Ticket(rate_key(), "prefetch")) is None:
+            prefetcher().forget(key)
+            return
+
+@st.fragment(run_every=N8N_PREFETCH_IDLE_SECONDS)
+def prefetch_timer():
+    # An idle session has no full reruns to start a round from; this ticks while the page is open
+    count_rerun("prefetch timer")
+    maybe_prefetch()
+
+profile_section("jobs")
+collect_finished_jobs()
+maybe_prefetch()
+
 # ----------------------------
 # Sidebar (Navigation + Debug Toggle)
 # ----------------------------
-with st.sidebar:
+profile_section("sidebar")
+PAGES = ["Chat", "Recent Activity", "Performance", "Settings"]
+
+@st.fragment
+def sidebar_panel():
+    count_rerun("sidebar")
     st.markdown("### Hustad AI")
     st.caption("Internal assistant dashboard")
 
-    show_debug = st.checkbox("Show debug (raw responses)", value=False)
+    show_debug = st.checkbox("Show debug (raw responses)", value=st.session_state.show_debug)
 
-    st.session_state.page = st.radio(
+    page = st.radio(
         "Navigate",
-        ["Chat", "Recent Activity", "Settings"],
-        index=["Chat", "Recent Activity", "Settings"].index(st.session_state.page),
+        PAGES,
+        index=PAGES.index(st.session_state.page),
     )
 
+    # Both change what the main area draws, so they need a full rerun
+    if show_debug != st.session_state.show_debug or page != st.session_state.page:
+        st.session_state.show_debug = show_debug
+        st.session_state.page = page
+        st.rerun()
+
     st.markdown('<div class="divider"></div>', unsafe_allow_html=True)
 
     st.markdown("**Session**")
@@ -669,20 +1966,42 @@ with st.sidebar:
     st.markdown('<div class="divider"></div>', unsafe_allow_html=True)
 
     if st.button("🧹 Clear chat"):
-        st.session_state.messages = []
+        cancel_jobs()
+        get_conversation_store(CHAT_DB_PATH).clear(st.session_state.session_id)
+        st.session_state.history_limit = HISTORY_PAGE_SIZE
+        st.session_state.render_window = CHAT_RENDER_WINDOW
+        entry = session_cache()
+        entry["block_memo"].clear()
+        entry["messages"] = []
         st.rerun()
 
+    rerun_counter()
+
+@st.fragment(run_every=PANEL_REFRESH_SECONDS)
+def rerun_counter():
+    # Most reruns are other fragments', so this polls; its own ticks aren't counted
+    counts = st.session_state.rerun_counts
+    st.caption(f"Reruns: {counts['full']} full • {counts['fragment']} fragment (last: {st.session_state.last_rerun})")
+
+with st.sidebar:
+    sidebar_panel()
+    if N8N_PREFETCH:
+        prefetch_timer()
+
 # ----------------------------
 # Top bar
 # ----------------------------
+profile_section("top bar")
+BACKEND_CHIPS = {"online": "🟢 Online", "degraded": "🟠 Degraded", "offline": "🔴 n8n offline"}
+
 st.markdown(
-    """
+    f"""
     <div class="topbar" style="display:flex; align-items:center; justify-content:space-between; padding:0.85rem 1rem;">
       <div>
         <div class="brand" style="font-size:1.1rem; font-weight:900; letter-spacing:.2px;">Hustad AI Assistant</div>
         <div class="subtle">Chat + tools + property/ticket workflows</div>
       </div>
-      <div class="chip">🟢 Online</div>
+      <div class="chip">{BACKEND_CHIPS[backend_health().state()]}</div>
     </div>
     """,
     unsafe_allow_html=True,
@@ -692,89 +2011,121 @@ st.write("")
 # ----------------------------
 # Pages
 # ----------------------------
+profile_section("page")
 if st.session_state.page == "Chat":
     left, right = st.columns([2.2, 1], gap="large")
 
     with left:
-        for msg in st.session_state.messages:
-            with st.chat_message(msg["role"]):
-                st.write(msg["content"])
-                if show_debug and msg.get("raw") is not None and msg["role"] == "assistant":
-                    with st.expander("Debug / Raw response", expanded=False):
-                        st.json(msg["raw"])
-
-        prompt = st.chat_input("Type your message…")
-        if prompt:
-            st.session_state.messages.append({"role": "user", "content": prompt})
-            with st.chat_message("user"):
-                st.write(prompt)
-
-            with st.chat_message("assistant"):
-                with st.spinner("Working…"):
-                    try:
-                        resp = call_n8n(prompt)
-                    except requests.exceptions.HTTPError as e:
-                        st.error("Request failed.")
-                        st.code(str(e))
-                        resp = {"message": "HTTP error calling backend.", "data": {}, "raw": {"error": str(e)}}
-                    except Exception as e:
-                        st.error("Unexpected error.")
-                        st.code(str(e))
-                        resp = {"message": "Unexpected error calling backend.", "data": {}, "raw": {"error": str(e)}}
-
-                if looks_like_property(resp.get("data", {})):
-                    st.write(resp.get("message", "Here’s what I found:"))
-                    render_property_card(resp.get("data", {}))
-                    assistant_text = resp.get("message", "Here’s what I found:")
-                else:
-                    st.write(resp.get("message", "") or "—")
-                    assistant_text = resp.get("message", "") or "—"
-
-                st.session_state.messages.append(
-                    {"role": "assistant", "content": assistant_text, "raw": resp.get("raw")}
-                )
-
-                if show_debug:
-                    with st.expander("Debug / Raw response (latest)", expanded=False):
-                        st.json(resp.get("raw"))
-
-            st.rerun()
+        chat_pane()
 
     with right:
-        st.markdown('<div class="card" style="padding:1rem;">', unsafe_allow_html=True)
-        st.markdown("#### Overview")
-        st.caption("Quick glance at your assistant usage")
-        st.metric("Messages", len(st.session_state.messages))
-        st.metric("Session", st.session_state.session_id)
-        st.markdown('<div class="divider"></div>', unsafe_allow_html=True)
-
-        st.markdown("#### Quick actions")
-        if st.button("🏢 Find a property"):
-            st.session_state.messages.append({"role": "user", "content": "show company Riverport Landings Senior"})
-            st.rerun()
-        if st.button("🎟️ Check tickets"):
-            st.session_state.messages.append({"role": "user", "content": "show tickets"})
-            st.rerun()
-        if st.button("📝 Create service ticket"):
-            st.session_state.messages.append({"role": "user", "content": "create service ticket for Riverport Landings Senior"})
-            st.rerun()
-
-        st.markdown("</div>", unsafe_allow_html=True)
+        overview_card()
 
 elif st.session_state.page == "Recent Activity":
     st.markdown("## Recent Activity")
     st.caption("A simple timeline of user requests + assistant responses.")
 
-    if not st.session_state.messages:
+    store = get_conversation_store(CHAT_DB_PATH)
+    if not store.count(st.session_state.session_id):
         st.info("No activity yet.")
     else:
-        for m in st.session_state.messages[-30:]:
+        c1, c2, c3 = st.columns([3, 1, 2])
+        query = c1.text_input("Search", placeholder="Words in the message…")
+        role = c2.selectbox("Role", ["all", "user", "assistant"])
+        dates = c3.date_input("Dates", value=(), format="YYYY-MM-DD")
+        since = datetime.combine(dates[0], datetime.min.time()).timestamp() if dates else None
+        until = (datetime.combine(dates[-1], datetime.min.time()) + timedelta(days=1)).timestamp() if dates else None
+
+        started = time.perf_counter()
+        ids = store.search(st.session_state.session_id, query, None if role == "all" else role, since, until)
+        search_ms = (time.perf_counter() - started) * 1000
+        pages = max((len(ids) + 29) // 30, 1)
+        page = st.number_input("Page (1 = newest)", min_value=1, max_value=pages, value=1) if pages > 1 else 1
+        st.caption(f"{len(ids)} matching messages • searched in {search_ms:.1f} ms")
+
+        for m in store.get_many(ids[(page - 1) * 30:page * 30]):
             st.markdown('<div class="card" style="padding:1rem;">', unsafe_allow_html=True)
-            st.markdown(f"**{m['role'].upper()}**")
+            st.markdown(f"**{m['role'].upper()}** · {datetime.fromtimestamp(m['created_at']).strftime('%Y-%m-%d %H:%M')}")
             st.write(m["content"])
             st.markdown("</div>", unsafe_allow_html=True)
             st.write("")
 
+elif st.session_state.page == "Performance":
+    st.markdown("## Performance")
+    st.caption(
+        f"Timings for this server process, all sessions. Percentiles cover the last {METRICS_WINDOW} samples per stage; "
+        "counts and bytes are totals since start."
+    )
+
+    summary = metrics().summary()
+    if not summary:
+        st.info("No samples yet.")
+    else:
+        st.dataframe(
+            [
+                {
+                    "Stage": stage,
+                    "Count": row["count"],
+                    "p50 ms": round(row["p50"], 1),
+                    "p95 ms": round(row["p95"], 1),
+                    "p99 ms": round(row["p99"], 1),
+                    "Mean ms": round(row["mean"], 1),
+                    "KB sent": round(row["bytes_sent"] / 1024, 1),
+                    "KB received": round(row["bytes_received"] / 1024, 1),
+                }
+                for stage, row in summary.items()
+            ],
+            hide_index=True,
+        )
+
+        stage = st.selectbox("Latency histogram", list(summary))
+        samples = metrics().samples(stage)
+        width = max(samples) / 20 or 1
+        buckets = [0] * 21
+        for ms in samples:
+            buckets[int(ms / width)] += 1
+        st.bar_chart({"ms": [round(i * width, 1) for i in range(21)], "samples": buckets}, x="ms", y="samples")
+
+        c1, c2, c3 = st.columns(3)
+        c1.download_button("⬇️ Prometheus", metrics().to_prometheus(), "hustad_metrics.prom", "text/plain")
+        c2.download_button("⬇️ JSON", metrics().to_json(), "hustad_metrics.json", "application/json")
+        if c3.button("Reset"):
+            metrics().reset()
+            st.rerun()
+
+    sessions = session_registry().stats()
+    st.caption(
+        f"Sessions: {sessions['active']} active in the last {SessionRegistry.ACTIVE_SECONDS // 60} min • "
+        f"{sessions['tracked']} tracked • {sessions['evicted']} evicted (idle > {SESSION_IDLE_TTL / 60:g} min or over "
+        f"{SESSION_MAX}) • ≈{sessions['approx_bytes'] / 1048576:.1f} MB of cached turns"
+    )
+
+    if METRICS_EXPORT_PATH:
+        st.caption(f"Also written to `{METRICS_EXPORT_PATH}` at most every {METRICS_EXPORT_SECONDS:g}s.")
+
+    profiles = get_startup_profiles()
+    if STARTUP_PROFILE and profiles:
+        st.markdown("### Startup profile")
+        # This run is still going, so "last" is the previous full run
+        cold, last = dict(profiles["cold"]), dict(profiles["last"])
+        st.dataframe(
+            [
+                {"Section": section, "Cold start ms": round(ms, 1), "Last run ms": round(last.get(section, 0), 1)}
+                for section, ms in cold.items()
+            ],
+            hide_index=True,
+        )
+
+        def first_paint(profile: dict) -> float:
+            # The sidebar is the first thing a user sees; everything before it delays the page
+            sections = list(profile)
+            return sum(profile[s] for s in sections[:sections.index("sidebar")])
+
+        st.caption(
+            f"Time to first paint (up to the sidebar): {first_paint(cold):.0f} ms cold • {first_paint(last):.0f} ms last run. "
+            "The cold start is this process's first full run, before caches were warm."
+        )
+
 elif st.session_state.page == "Settings":
     st.markdown("## Settings")
     st.caption("Control app behavior")
@@ -783,6 +2134,88 @@ elif st.session_state.page == "Settings":
     st.write("Webhook configured:", "✅" if bool(N8N_WEBHOOK_URL) else "❌")
     if not N8N_WEBHOOK_URL:
         st.warning("Add `N8N_WEBHOOK_URL` to Streamlit Secrets.")
+    elif len(N8N_WEBHOOK_URLS) > 1:
+        st.dataframe(endpoint_router().stats(), hide_index=True)
+        st.caption(
+            f"{len(N8N_WEBHOOK_URLS)} endpoints • ejected after {N8N_EJECT_AFTER} consecutive failures • "
+            + (f"probing `{N8N_HEALTH_PATH}` every {N8N_HEALTH_INTERVAL:g}s" if N8N_HEALTH_INTERVAL > 0 else "no health probes")
+        )
+    if N8N_BACKEND_MODE in ("record", "replay"):
+        cassette_stats = get_cassette(N8N_CASSETTE_PATH).stats()
+        st.caption(
+            f"Backend mode: **{N8N_BACKEND_MODE}** • cassette `{N8N_CASSETTE_PATH}` • "
+            f"{cassette_stats['exchanges']} exchanges for {cassette_stats['prompts']} prompts"
+            + (f" • {cassette_stats['recorded']} recorded this run" if N8N_BACKEND_MODE == "record" else "")
+            + (f" • latency ×{N8N_REPLAY_LATENCY_SCALE:g}" if N8N_BACKEND_MODE == "replay" else "")
+        )
+    cache_stats = get_response_cache(CACHE_MAX_ENTRIES).stats()
+    st.caption(
+        f"Response cache: {cache_stats['entries']} entries • {cache_stats['hits']} hits / "
+        f"{cache_stats['misses']} misses ({cache_stats['hit_rate']:.0%}) • {cache_stats['bypassed']} bypassed"
+    )
+    flight_stats = get_single_flight().stats()
+    st.caption(
+        f"Single-flight: {flight_stats['backend_calls']} backend calls • "
+        f"{flight_stats['coalesced']} coalesced • {flight_stats['in_flight']} in flight"
+    )
+    health_stats = backend_health().stats()
+    st.caption(
+        f"Resilience: {BACKEND_CHIPS[backend_health().state()]} • {health_stats['retries']} retries • "
+        f"{health_stats['hedged']} hedged ({health_stats['hedge_wins']} won by the hedge) • "
+        f"{health_stats['fast_failed']} failed fast while the circuit was open"
+    )
+    admission_stats = admission().stats()
+    st.caption(
+        f"Admission: {admission_stats['in_flight']}/{N8N_MAX_IN_FLIGHT} in flight • queued "
+        + " / ".join(f"{n} {name}" for name, n in admission_stats["queued"].items())
+        + f" • {admission_stats['admitted']} admitted (p95 wait {admission_stats['p95_wait_ms']:.0f} ms) • "
+        + (
+            f"{admission_stats['rate_limited']} rate limited ({N8N_USER_RATE:g}/min per {'browser' if st.session_state.user_id == DEFAULT_USER_ID else 'user'}, burst {N8N_USER_BURST}) • "
+            if N8N_USER_RATE > 0
+            else "no per-user rate limit • "
+        )
+        + f"{admission_stats['skipped']} prefetches skipped"
+    )
+    if N8N_PREFETCH:
+        prefetch_stats = prefetcher().stats()
+        st.caption(
+            f"Prefetch: {prefetch_stats['issued']} issued • {prefetch_stats['hits']} hits / "
+            f"{prefetch_stats['wasted']} wasted ({prefetch_stats['hit_rate']:.0%}) • "
+            f"{prefetch_stats['pending']} warm • {prefetch_stats['over_budget']} skipped over budget "
+            f"({N8N_PREFETCH_BUDGET}/user/hour)"
+        )
+    if st.button("Clear response cache"):
+        get_response_cache(CACHE_MAX_ENTRIES).clear()
+        st.rerun()
+    st.session_state.stream_replies = st.toggle(
+        "Stream replies",
+        value=st.session_state.stream_replies,
+        help="Render the assistant reply as n8n streams it. Non-streaming workflows still work.",
+    )
+
+    st.markdown("### Debug payloads")
+    blob_stats = blob_store().stats()
+    st.caption(
+        f"{blob_stats['blobs']} raw responses • {blob_stats['size'] / 1048576:.1f} MB raw, "
+        f"{blob_stats['stored_size'] / 1048576:.1f} MB compressed • kept up to {BLOB_MAX_AGE_DAYS:g} days / "
+        f"{BLOB_MAX_BYTES / 1048576:.0f} MB"
+    )
+    if st.button("Apply retention now"):
+        blob_store().evict()
+        st.rerun()
+
+    st.markdown("### Appearance")
+    fx_modes = ["off", "lite", "full"]
+    fx_mode = st.radio(
+        "Background effects",
+        fx_modes,
+        index=fx_modes.index(st.session_state.fx_mode) if st.session_state.fx_mode in fx_modes else 2,
+        horizontal=True,
+        help="Particle animation behind the app. Use lite or off on slower machines.",
+    )
+    if fx_mode != st.session_state.fx_mode:
+        st.session_state.fx_mode = fx_mode
+        st.rerun()
 
     st.markdown("### User")
     new_user = st.text_input("User ID", st.session_state.user_id)
@@ -790,3 +2223,12 @@ elif st.session_state.page == "Settings":
         st.session_state.user_id = new_user
         st.success("User updated.")
         st.rerun()
+
+# ----------------------------
+# Instrumentation: full-run timing + export (st.rerun() exits early, so those runs are not counted)
+# ----------------------------
+metrics().record("rerun", (time.perf_counter() - run_started) * 1000)
+if STARTUP_PROFILE:
+    record_startup_profile()
+if METRICS_EXPORT_PATH:
+    metrics().export(METRICS_EXPORT_PATH, METRICS_EXPORT_SECONDS)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The app's Streamlit-free parts live in the hustad package next to streamlit_app.py
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
@@ -0,0 +1,119 @@
+import threading
+import time
+
+from hustad.admission import Admission, Ticket
+
+def _wait_until(condition, timeout: float = 2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+def _acquire_in_thread(gate, ticket, admitted: list) -> threading.Thread:
+    def run():
+        if gate.acquire(ticket):
+            admitted.append(ticket.priority)
+            gate.release()
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+def test_queued_calls_are_admitted_chat_first():
+    gate = Admission(max_in_flight=1, rate_per_minute=0, burst=1)
+    assert gate.acquire(Ticket("holder"))
+
+    admitted = []
+    quick = _acquire_in_thread(gate, Ticket("a", "quick"), admitted)
+    _wait_until(lambda: gate.stats()["queued"]["quick"] == 1)
+    chat = _acquire_in_thread(gate, Ticket("b", "chat"), admitted)
+    _wait_until(lambda: gate.stats()["queued"]["chat"] == 1)
+
+    gate.release()
+    quick.join(2)
+    chat.join(2)
+    assert admitted == ["chat", "quick"]
+    assert gate.stats()["in_flight"] == 0
+
+def test_prefetch_never_waits():
+    gate = Admission(max_in_flight=1, rate_per_minute=0, burst=1)
+    assert gate.acquire(Ticket("holder"))
+    assert not gate.acquire(Ticket("u", "prefetch"))
+    assert gate.stats()["skipped"] == 1
+
+def test_cancelled_ticket_leaves_the_queue():
+    gate = Admission(max_in_flight=1, rate_per_minute=0, burst=1)
+    assert gate.acquire(Ticket("holder"))
+    ticket = Ticket("u")
+    admitted = []
+    thread = _acquire_in_thread(gate, ticket, admitted)
+    _wait_until(lambda: ticket.position == 1)
+
+    ticket.cancelled.set()
+    thread.join(2)
+    assert admitted == []
+    assert gate.stats()["queued"]["chat"] == 0
+
+def test_tokens_refill_at_the_configured_rate():
+    gate = Admission(max_in_flight=4, rate_per_minute=60, burst=2)
+    assert gate._tokens("u", 100.0) == 2  # a new user starts with a full bucket
+
+    gate._spend("u", 100.0)
+    gate._spend("u", 100.0)
+    assert gate._tokens("u", 100.0) == 0
+    assert gate._tokens("u", 100.5) == 0.5
+    assert gate._tokens("u", 160.0) == 2  # never more than the burst
+
+def test_rate_limited_user_waits_for_a_token():
+    gate = Admission(max_in_flight=4, rate_per_minute=600, burst=1)
+    assert gate.acquire(Ticket("u"))
+    gate.release()
+
+    ticket = Ticket("u")
+    started = time.monotonic()
+    assert gate.acquire(ticket)
+    gate.release()
+    assert time.monotonic() - started >= 0.05  # one token every 0.1s
+    assert ticket.throttled
+    assert gate.stats()["rate_limited"] == 1
+
+def test_rate_limited_user_does_not_hold_up_others():
+    gate = Admission(max_in_flight=4, rate_per_minute=1, burst=1)
+    assert gate.acquire(Ticket("slow"))
+
+    throttled = Ticket("slow")
+    admitted = []
+    thread = _acquire_in_thread(gate, throttled, admitted)
+    _wait_until(lambda: throttled.ready_in > 0)
+
+    assert gate.acquire(Ticket("other"))
+    throttled.cancelled.set()
+    thread.join(2)
+    assert admitted == []
+
+def test_zero_rate_means_no_per_user_limit():
+    gate = Admission(max_in_flight=1, rate_per_minute=0, burst=1)
+    for _ in range(5):
+        assert gate.acquire(Ticket("u"))
+        gate.release()
+    assert gate.stats()["rate_limited"] == 0
+
+def test_try_acquire_only_takes_a_free_slot_nobody_is_waiting_for():
+    gate = Admission(max_in_flight=2, rate_per_minute=1, burst=1)
+    assert gate.try_acquire()
+    assert gate.try_acquire()
+    assert not gate.try_acquire()
+    gate.release()
+    gate.release()
+
+    # A free slot, but a rate-limited call is queued for it
+    assert gate.acquire(Ticket("u"))
+    gate.release()
+    waiting = Ticket("u")
+    thread = _acquire_in_thread(gate, waiting, [])
+    _wait_until(lambda: waiting.ready_in > 0)
+    assert not gate.try_acquire()
+
+    waiting.cancelled.set()
+    thread.join(2)
+    assert gate.try_acquire()
@@ -0,0 +1,37 @@
+import time
+
+from hustad.health import BackendHealth
+
+def test_breaker_opens_after_threshold_failures():
+    health = BackendHealth(threshold=2, reset_seconds=60)
+    health.failure()
+    assert health.before_call() is None
+    assert health.state() == "degraded"
+
+    health.failure()
+    assert health.before_call() > 0
+    assert health.state() == "offline"
+    assert health.stats()["fast_failed"] == 1
+
+def test_breaker_lets_one_probe_through_then_closes():
+    health = BackendHealth(threshold=1, reset_seconds=0.05)
+    health.failure()
+    assert health.before_call() is not None
+    time.sleep(0.06)
+
+    assert health.before_call() is None  # the probe
+    assert health.before_call() == 0  # everyone else waits for it
+    health.success()
+    assert health.before_call() is None
+    assert health.state() == "online"
+
+def test_failed_probe_reopens_the_breaker():
+    health = BackendHealth(threshold=3, reset_seconds=0.05)
+    for _ in range(3):
+        health.failure()
+    time.sleep(0.06)
+
+    assert health.before_call() is None
+    health.failure()
+    assert health.before_call() > 0
+    assert health.state() == "offline"
@@ -0,0 +1,83 @@
+import threading
+import time
+
+import pytest
+
+from hustad.conversations import ConversationStore, SearchIndex
+
+@pytest.fixture
+def store(tmp_path):
+    return ConversationStore(str(tmp_path / "chat.sqlite3"))
+
+def _row(msg_id: int, content: str, role: str = "user", created_at: float = None) -> dict:
+    return {"id": msg_id, "role": role, "content": content, "created_at": float(msg_id if created_at is None else created_at)}
+
+def test_search_matches_every_word_and_the_last_as_a_prefix():
+    index = SearchIndex()
+    index.load("s", [_row(1, "Show tickets for Riverport"), _row(2, "riverport landings"), _row(3, "Tickets, please")])
+
+    assert index.search("s", "riverport") == [2, 1]
+    assert index.search("s", "TICKETS riv") == [1]
+    assert index.search("s", "tick") == [3, 1]
+    assert index.search("s", "nothing") == []
+    assert index.search("other", "tickets") == []  # never loaded
+
+def test_search_filters_on_role_and_dates():
+    index = SearchIndex()
+    index.load("s", [_row(1, "hello"), _row(2, "hello back", "assistant"), _row(3, "hello again")])
+
+    assert index.search("s") == [3, 2, 1]
+    assert index.search("s", role="assistant") == [2]
+    assert index.search("s", "hello", role="user") == [3, 1]
+    assert index.search("s", since=2, until=3) == [2]  # until is exclusive
+    assert index.search("s", "hello", since=4) == []
+
+def test_added_messages_are_searchable_once_loaded():
+    index = SearchIndex()
+    index.add("s", _row(1, "before the load"))  # no index yet: ignored
+    assert not index.loaded("s")
+
+    index.load("s", [_row(1, "first message")])
+    index.add("s", _row(1, "first message"))  # already there
+    index.add("s", _row(2, "second message"))
+    assert index.search("s", "message") == [2, 1]
+    assert index.search("s", "before") == []
+
+def test_store_search_builds_the_index_and_keeps_it_current(store):
+    first = store.append("s", "u", "user", "Show company Riverport")
+    store.append("other", "u", "user", "Riverport elsewhere")
+    assert store.search("s", "riverport") == [first["id"]]
+    assert store.index.loaded("s")
+
+    second = store.append("s", "u", "assistant", "Here is Riverport")
+    assert store.search("s", "riverport") == [second["id"], first["id"]]
+    assert [m["content"] for m in store.get_many(store.search("s", "here"))] == ["Here is Riverport"]
+
+def test_clear_rebuilds_the_index_from_scratch(store):
+    store.append("s", "u", "user", "old ticket")
+    assert store.search("s", "ticket")
+
+    store.clear("s")
+    assert not store.index.loaded("s")
+    assert store.search("s", "ticket") == []
+
+    new = store.append("s", "u", "user", "new ticket")
+    assert store.search("s", "ticket") == [new["id"]]
+
+def test_message_appended_while_the_index_loads_is_not_lost(store):
+    store.append("s", "u", "user", "hello alpha")
+    load = store.index.load
+    appender = []
+
+    def racing_load(session_id, rows):
+        # Another session thread appends right as the rows come back
+        thread = threading.Thread(target=store.append, args=(session_id, "u", "user", "needle bravo"))
+        thread.start()
+        appender.append(thread)
+        time.sleep(0.05)
+        load(session_id, rows)
+
+    store.index.load = racing_load
+    store.search("s", "alpha")
+    appender[0].join(2)
+    assert len(store.search("s", "needle")) == 1
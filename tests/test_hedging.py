@@ -0,0 +1,93 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from hustad.admission import Admission, Ticket
+from hustad.hedging import first_success, submit_hedge
+
+def _wait_until(condition, timeout: float = 2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+def _gate_with_caller(max_in_flight: int = 2) -> Admission:
+    gate = Admission(max_in_flight=max_in_flight, rate_per_minute=0, burst=1)
+    assert gate.acquire(Ticket("caller"))
+    return gate
+
+def _returns_after(event: threading.Event, value):
+    event.wait(2)
+    return value
+
+def _fails():
+    raise ValueError("backend said no")
+
+def test_hedge_slot_is_held_while_the_losing_primary_runs():
+    gate = _gate_with_caller()
+    pool = ThreadPoolExecutor(2)
+    primary_done = threading.Event()
+    primary = pool.submit(_returns_after, primary_done, "slow")
+
+    hedge = submit_hedge(gate, pool, primary, lambda: "fast")
+    assert first_success(primary, hedge) is hedge
+    gate.release()  # the caller is done with the hedge's answer
+
+    # The primary is still running, so it still counts against the cap
+    assert not primary.done()
+    assert gate.stats()["in_flight"] == 1
+
+    primary_done.set()
+    _wait_until(lambda: gate.stats()["in_flight"] == 0)
+    pool.shutdown()
+
+def test_hedge_slot_is_held_while_the_losing_hedge_runs():
+    gate = _gate_with_caller()
+    pool = ThreadPoolExecutor(2)
+    primary_done, hedge_done = threading.Event(), threading.Event()
+    primary = pool.submit(_returns_after, primary_done, "primary")
+    hedge = submit_hedge(gate, pool, primary, _returns_after, hedge_done, "hedge")
+
+    primary_done.set()
+    assert first_success(primary, hedge) is primary
+    gate.release()
+    assert gate.stats()["in_flight"] == 1
+
+    hedge_done.set()
+    _wait_until(lambda: gate.stats()["in_flight"] == 0)
+    pool.shutdown()
+
+def test_no_hedge_without_a_spare_slot():
+    gate = _gate_with_caller(max_in_flight=1)
+    pool = ThreadPoolExecutor(2)
+    primary = pool.submit(lambda: "only")
+    assert submit_hedge(gate, pool, primary, lambda: "never") is None
+    assert gate.stats()["in_flight"] == 1
+    pool.shutdown()
+
+def test_a_failed_request_loses_to_a_slower_success():
+    gate = _gate_with_caller()
+    pool = ThreadPoolExecutor(2)
+    hedge_done = threading.Event()
+    primary = pool.submit(_fails)
+    hedge = submit_hedge(gate, pool, primary, _returns_after, hedge_done, "hedge")
+
+    hedge_done.set()
+    assert first_success(primary, hedge).result() == "hedge"
+    pool.shutdown()
+
+def test_both_failing_reports_the_primary():
+    gate = _gate_with_caller()
+    pool = ThreadPoolExecutor(2)
+    primary = pool.submit(_fails)
+    hedge = submit_hedge(gate, pool, primary, _fails)
+
+    winner = first_success(primary, hedge)
+    assert winner is primary
+    with pytest.raises(ValueError):
+        winner.result()
+    gate.release()
+    _wait_until(lambda: gate.stats()["in_flight"] == 0)
+    pool.shutdown()
@@ -0,0 +1,72 @@
+import pytest
+
+from hustad.response_cache import ResponseCache, classify_prompt
+
+@pytest.mark.parametrize(
+    "prompt",
+    [
+        "create service ticket for Riverport Landings Senior",
+        "Please close ticket 12",
+        "can you please add a note to ticket 7",
+        "I'd like to schedule an inspection",
+        "show tickets and cancel 12",
+        "Ticket 5: assign it to Dana",
+        "New ticket for the roof leak",
+    ],
+)
+def test_imperative_change_requests_are_mutations(prompt):
+    assert classify_prompt(prompt) == "mutation"
+
+@pytest.mark.parametrize(
+    "prompt, intent",
+    [
+        ("show new tickets", "tickets"),
+        ("Tickets to close this week", "tickets"),
+        ("any update on ticket 5?", "tickets"),
+        ("which buildings were added last month", "property"),
+        ("show company  Riverport   Landings", "property"),
+        ("what changed since yesterday", "other"),
+        ("hello", "other"),
+    ],
+)
+def test_mutation_words_inside_a_lookup_are_not_mutations(prompt, intent):
+    assert classify_prompt(prompt) == intent
+
+def test_cache_hit_returns_a_copy():
+    cache = ResponseCache(max_entries=4)
+    cache.put(("p", "u"), {"message": "hi"}, ttl=60)
+
+    hit = cache.get(("p", "u"))
+    assert hit == {"message": "hi"}
+    hit["message"] = "changed"
+    assert cache.get(("p", "u")) == {"message": "hi"}
+    assert cache.get(("q", "u")) is None
+    assert cache.stats()["hits"] == 2 and cache.stats()["misses"] == 1
+
+def test_expired_entries_are_misses():
+    cache = ResponseCache(max_entries=4)
+    cache.put(("p", "u"), {"message": "hi"}, ttl=0)
+    assert not cache.contains(("p", "u"))
+    assert cache.get(("p", "u")) is None
+    assert cache.stats()["entries"] == 0
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResponseCache(max_entries=2)
+    cache.put(("a", "u"), {"message": "a"}, ttl=60)
+    cache.put(("b", "u"), {"message": "b"}, ttl=60)
+    cache.get(("a", "u"))
+    cache.put(("c", "u"), {"message": "c"}, ttl=60)
+
+    assert cache.contains(("a", "u")) and cache.contains(("c", "u"))
+    assert not cache.contains(("b", "u"))
+    assert cache.stats()["evictions"] == 1
+
+def test_bypass_drops_only_that_users_entries():
+    cache = ResponseCache(max_entries=4)
+    cache.put(("p", "u"), {"message": "mine"}, ttl=60)
+    cache.put(("p", "other"), {"message": "theirs"}, ttl=60)
+
+    cache.bypass("u")
+    assert not cache.contains(("p", "u"))
+    assert cache.contains(("p", "other"))
+    assert cache.stats()["bypassed"] == 1
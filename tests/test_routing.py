@@ -0,0 +1,101 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from hustad.routing import EndpointRouter
+
+FAST, SLOW = "http://fast.invalid/webhook", "http://slow.invalid/webhook"
+
+def _router(*urls, eject_after: int = 2, probe_interval: float = 0) -> EndpointRouter:
+    return EndpointRouter(urls, eject_after, probe_interval, 0.5, "/healthz", sticky_max=8)
+
+def _call(router, url_expected: str = None, ms: float = None, ok: bool = True) -> str:
+    url = router.acquire()
+    if url_expected:
+        assert url == url_expected
+    router.release(url, ms, ok)
+    return url
+
+def _healthy(router, url: str) -> bool:
+    return next(e["healthy"] for e in router.stats() if url.split("/")[2] == e["endpoint"])
+
+class _Health(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(200 if self.path == "/healthz" else 404)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def health_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Health)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/webhook"
+    server.shutdown()
+
+def _wait_until(condition, timeout: float = 2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+def test_lowest_ewma_endpoint_gets_the_call():
+    router = _router(FAST, SLOW)
+    fast, slow = router.endpoints[FAST], router.endpoints[SLOW]
+    fast["ewma_ms"], slow["ewma_ms"] = 100.0, 400.0
+    _call(router, FAST, ms=200)
+
+    assert fast["ewma_ms"] == pytest.approx(130.0)  # 30% of the way to the new sample
+    assert slow["ewma_ms"] == 400.0
+
+def test_in_flight_calls_weigh_on_the_score():
+    router = _router(FAST, SLOW)
+    router.endpoints[FAST]["ewma_ms"], router.endpoints[SLOW]["ewma_ms"] = 100.0, 250.0
+
+    held = [router.acquire(), router.acquire()]
+    assert held == [FAST, FAST]  # 1 × 100, then 2 × 100 < 250
+    assert router.acquire() == SLOW  # 3 × 100 > 250
+
+def test_endpoint_without_samples_gets_tried():
+    router = _router(FAST, SLOW)
+    router.endpoints[FAST]["ewma_ms"] = 100.0
+    router.endpoints[FAST]["in_flight"] = 1  # same default score otherwise: a coin toss
+    assert router.acquire() == SLOW
+
+def test_failing_endpoint_is_ejected_and_readmitted_by_a_success():
+    router = _router(FAST, SLOW, eject_after=2)
+    router.endpoints[FAST]["ewma_ms"], router.endpoints[SLOW]["ewma_ms"] = 100.0, 400.0
+    _call(router, FAST, ok=False)
+    assert _healthy(router, FAST)  # one failure is not enough
+    _call(router, FAST, ok=False)
+    assert not _healthy(router, FAST)
+
+    _call(router, SLOW, ms=400)
+    # With every endpoint ejected, calls still go to the least bad one
+    router.endpoints[SLOW]["healthy"] = False
+    _call(router, FAST, ms=100)
+    assert _healthy(router, FAST)
+
+def test_probe_readmits_a_live_endpoint_and_ejects_a_dead_one(health_server):
+    dead = "http://127.0.0.1:9/webhook"  # discard port: nothing listens
+    router = _router(health_server, dead, eject_after=1, probe_interval=0.05)
+    try:
+        router.endpoints[health_server]["healthy"] = False
+        _wait_until(lambda: _healthy(router, health_server) and not _healthy(router, dead))
+        assert all(e["probed_s_ago"] is not None for e in router.stats())
+    finally:
+        router.stop()
+
+def test_stop_ends_the_probe_thread(health_server):
+    router = _router(health_server, FAST, probe_interval=0.05)
+    assert router.prober.is_alive()
+    router.stop()
+    router.prober.join(2)
+    assert not router.prober.is_alive()
+
+def test_single_endpoint_is_never_probed():
+    assert _router(FAST, probe_interval=0.05).prober is None
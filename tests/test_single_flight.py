@@ -0,0 +1,103 @@
+import threading
+import time
+
+import pytest
+
+from hustad.single_flight import SingleFlight
+
+def _must_not_call():
+    pytest.fail("followers must not call the backend")
+
+def _followers(flight, key, count: int, results: list, fn=_must_not_call) -> list:
+    def run():
+        try:
+            results.append(flight.do(key, fn))
+        except BaseException as e:
+            results.append(e)
+
+    threads = [threading.Thread(target=run) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+def _lead(flight, key, outcome, followers: int, results: list, follower_fn=_must_not_call):
+    """Run a leader that blocks until `followers` calls have joined it, then returns or raises `outcome`."""
+    joined = threading.Event()
+
+    def fn():
+        joined.wait(2)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+
+    leader = threading.Thread(target=lambda: results.append(_capture(flight.do, key, fn)))
+    leader.start()
+    while flight.stats()["in_flight"] == 0:
+        time.sleep(0.001)
+    threads = _followers(flight, key, followers, results, follower_fn)
+    while flight.stats()["coalesced"] < followers:
+        time.sleep(0.001)
+    joined.set()
+    for thread in [leader, *threads]:
+        thread.join(2)
+
+def _capture(fn, *args):
+    try:
+        return fn(*args)
+    except BaseException as e:
+        return e
+
+def test_single_flight_shares_the_leaders_result():
+    flight = SingleFlight()
+    results = []
+    _lead(flight, "k", {"message": "ok"}, 3, results)
+
+    assert results == [{"message": "ok"}] * 4
+    assert len({id(result) for result in results}) == 4  # each caller gets its own copy
+    assert flight.stats() == {"in_flight": 0, "backend_calls": 1, "coalesced": 3}
+
+def test_single_flight_fans_the_leaders_error_out():
+    flight = SingleFlight()
+    error = ValueError("n8n said no")
+    results = []
+    _lead(flight, "k", error, 3, results)
+
+    assert len(results) == 4
+    assert all(result is error for result in results)
+    assert flight.stats()["in_flight"] == 0
+
+def _reissue(calls: list):
+    def fn():
+        calls.append(1)
+        time.sleep(0.05)  # long enough for the other follower to join the new leader
+        return {"message": "reissued"}
+
+    return fn
+
+def test_single_flight_cancelled_leader_hands_over_to_a_follower():
+    flight = SingleFlight()
+    calls, results = [], []
+    _lead(flight, "k", GeneratorExit(), 2, results, _reissue(calls))
+
+    followers = [result for result in results if not isinstance(result, GeneratorExit)]
+    assert followers == [{"message": "reissued"}] * 2
+    assert len(calls) == 1  # one follower re-issued the call, the other joined it
+    assert flight.stats() == {"in_flight": 0, "backend_calls": 2, "coalesced": 1}
+
+def test_single_flight_leader_that_gave_up_hands_over_to_a_follower():
+    class NotAdmitted(Exception):
+        pass
+
+    flight = SingleFlight(gave_up=(NotAdmitted,))
+    calls, results = [], []
+    _lead(flight, "k", NotAdmitted(), 2, results, _reissue(calls))
+
+    assert sum(isinstance(result, NotAdmitted) for result in results) == 1
+    assert [result for result in results if isinstance(result, dict)] == [{"message": "reissued"}] * 2
+    assert len(calls) == 1
+
+def test_single_flight_forgets_a_finished_key():
+    flight = SingleFlight()
+    with pytest.raises(ValueError):
+        flight.do("k", lambda: (_ for _ in ()).throw(ValueError("first")))
+    assert flight.do("k", lambda: {"message": "second"}) == {"message": "second"}
@@ -0,0 +1,59 @@
+import requests
+
+from hustad.streaming import chunk_text, is_stream_event, iter_ndjson, iter_sse, iter_text_lines
+
+class _ChunkedRaw:
+    """Stands in for urllib3's response: read() hands back the body in exactly the given pieces."""
+
+    def __init__(self, chunks: list):
+        self._chunks = list(chunks)
+
+    def read(self, amt=None) -> bytes:
+        return self._chunks.pop(0) if self._chunks else b""
+
+def _response(*chunks: bytes) -> requests.Response:
+    r = requests.Response()
+    r.raw = _ChunkedRaw(chunks)
+    r.encoding = "utf-8"
+    return r
+
+def test_sse_event_split_across_chunks():
+    r = _response(b'data: {"con', b'tent": "Hel', b'lo"}\n', b"\ndata: ", b"plain text\n\n", b"data: [DONE]\n\n")
+    assert list(iter_sse(r)) == [{"content": "Hello"}, "plain text"]
+
+def test_sse_crlf_split_between_chunks():
+    r = _response(b"data: one\r", b"\n\r", b"\ndata: two\r\n", b"data: lines\r\n\r\n")
+    assert list(iter_sse(r)) == ["one", "two\nlines"]
+
+def test_sse_without_a_final_blank_line_keeps_the_last_event():
+    assert list(iter_sse(_response(b"data: tail"))) == ["tail"]
+
+def test_multibyte_utf8_split_across_chunks():
+    body = '{"content": "Café — naïve ✓"}\n'.encode()
+    cuts = [0, 17, 21, 26, 32, len(body)]  # inside é, —, ï and ✓
+    pieces = [body[start:end] for start, end in zip(cuts, cuts[1:])]
+    assert list(iter_text_lines(_response(*pieces))) == ['{"content": "Café — naïve ✓"}']
+
+def test_lines_only_end_at_newline():
+    # JSON.stringify leaves these raw inside strings; they must not end the line
+    r = _response('{"content": "a\u2028b\u2029c\x85d"}\n{"content": "next"}'.encode())
+    assert [event["content"] for event in iter_ndjson(iter_text_lines(r))] == ["a\u2028b\u2029c\x85d", "next"]
+
+def test_ndjson_skips_blank_lines_and_passes_other_text_through():
+    assert list(iter_ndjson(['{"type": "item", "content": "hi"}', "", "  ", "not json"])) == [
+        {"type": "item", "content": "hi"},
+        "not json",
+    ]
+
+def test_chunk_text_reads_the_reply_text_out_of_an_event():
+    assert chunk_text("raw") == "raw"
+    assert chunk_text({"type": "item", "content": "a"}) == "a"
+    assert chunk_text({"delta": "b"}) == "b"
+    assert chunk_text({"type": "begin", "content": "ignored"}) == ""
+    assert chunk_text({"content": 1}) == ""
+    assert chunk_text(["list"]) == ""
+
+def test_is_stream_event():
+    assert is_stream_event({"type": "begin"})
+    assert not is_stream_event({"type": "message"})
+    assert not is_stream_event("begin")